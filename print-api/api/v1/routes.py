@@ -1,10 +1,14 @@
 from datetime import datetime, timezone
 from flask import request, jsonify, current_app
 
+import config
 from . import v1_bp
 from .auth import require_auth, require_admin
-from .validation import validate_print_request, validate_raw_request
+from .validation import validate_print_request, validate_raw_request, validate_logo_request
 from print_queue.job import PrintJob
+from print_queue.merge import MERGE_FORMATS
+from driver.escpos_builder import decode_image
+from driver.logos import is_valid_key
 
 
 @v1_bp.route('/print', methods=['POST'])
@@ -16,11 +20,19 @@ def print_receipt():
         return jsonify({"error": "No JSON data provided"}), 400
 
     cleaned, errors = validate_print_request(data)
+    if cleaned.get('logo') and not current_app.extensions['logo_registry'].has(cleaned['logo']):
+        errors.append(f"Unknown logo '{cleaned['logo']}'")
+    if cleaned.get('template') and cleaned['template'] not in current_app.extensions['template_store']:
+        errors.append(f"Unknown template '{cleaned['template']}'")
     if errors:
         return jsonify({"error": "Validation failed", "details": errors}), 400
 
     job_queue = current_app.extensions['job_queue']
-    job = PrintJob(payload=cleaned, client_ip=request.remote_addr)
+    job = PrintJob(
+        payload=cleaned,
+        client_ip=request.remote_addr,
+        priority=cleaned.pop('priority', 'normal'),
+    )
 
     if not job_queue.submit(job):
         return jsonify({"error": "Queue full, try again later"}), 429
@@ -49,6 +61,7 @@ def print_raw():
         payload={"raw_data": raw_bytes},
         client_ip=request.remote_addr,
         is_raw=True,
+        priority=data.get('priority') or 'normal',
     )
 
     if not job_queue.submit(job):
@@ -61,6 +74,64 @@ def print_raw():
     }), 202
 
 
+@v1_bp.route('/merge', methods=['POST'])
+@require_auth
+def start_merge():
+    """Print one template per row of a JSONL or CSV body. Returns 202 with merge_id.
+
+    Query parameters: template (required), format ('jsonl' or 'csv';
+    default from Content-Type) and any /print option, applied to every row.
+    """
+    options = {k: v for k, v in request.args.items() if k not in ('template', 'format')}
+    for flag in ('bold', 'cut'):
+        if flag in options:
+            options[flag] = options[flag].lower() in ('true', '1', 't', 'yes')
+    template = request.args.get('template', '')
+
+    cleaned, errors = validate_print_request(dict(options, template=template))
+    if template and template not in current_app.extensions['template_store']:
+        errors.append(f"Unknown template '{template}'")
+    fmt = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'jsonl')
+    if fmt not in MERGE_FORMATS:
+        errors.append(f"Invalid format '{fmt}', must be one of {set(MERGE_FORMATS)}")
+    if not request.content_length and not request.headers.get('Transfer-Encoding'):
+        errors.append("Request body with one row per line is required")
+    if errors:
+        return jsonify({"error": "Validation failed", "details": errors}), 400
+
+    cleaned.pop('template', None)
+    priority = cleaned.pop('priority', 'bulk')
+    request.max_content_length = config.MERGE_MAX_BYTES
+    run = current_app.extensions['merge_manager'].start(
+        template, fmt, request.stream, cleaned, client_ip=request.remote_addr,
+        priority=priority)
+
+    return jsonify({
+        "status": "running",
+        "merge_id": run.id,
+    }), 202
+
+
+@v1_bp.route('/merge/<merge_id>', methods=['GET'])
+@require_auth
+def merge_status(merge_id):
+    """Progress of a mail-merge run, including failed rows."""
+    run = current_app.extensions['merge_manager'].get(merge_id)
+    if not run:
+        return jsonify({"error": "Merge not found"}), 404
+    return jsonify(run.to_dict()), 200
+
+
+@v1_bp.route('/merge/<merge_id>', methods=['DELETE'])
+@require_auth
+def cancel_merge(merge_id):
+    """Stop a mail-merge run; rows already queued still print."""
+    run = current_app.extensions['merge_manager'].cancel(merge_id)
+    if not run:
+        return jsonify({"error": "Merge not found"}), 404
+    return jsonify(run.to_dict()), 200
+
+
 @v1_bp.route('/status', methods=['GET'])
 @require_auth
 def status():
@@ -76,11 +147,64 @@ def status():
         return jsonify({
             "job_id": job.id,
             "state": job.state.value,
+            "priority": job.priority,
             "error": job.error,
+            "metrics": job.metrics,
         }), 200
 
     return jsonify({
         "printer": "connected" if printer_driver.is_available() else "disconnected",
         "queue_depth": job_queue.depth,
+        "class_depths": job_queue.class_depths(),
+        "jobs": job_queue.registry_stats(),
         "timestamp": datetime.now(timezone.utc).isoformat(),
     }), 200
+
+
+@v1_bp.route('/logos', methods=['GET'])
+@require_auth
+def list_logos():
+    """Logos stored in printer NV memory and how much of it they use."""
+    return jsonify(current_app.extensions['logo_registry'].status()), 200
+
+
+@v1_bp.route('/logos/<key>', methods=['PUT'])
+@require_admin
+def put_logo(key):
+    """Store a base64 image in printer NV memory under a 2-character key (admin only)."""
+    if not is_valid_key(key):
+        return jsonify({"error": "Logo key must be 2 printable ASCII characters"}), 400
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "No JSON data provided"}), 400
+
+    image_b64, errors = validate_logo_request(data)
+    if errors:
+        return jsonify({"error": "Validation failed", "details": errors}), 400
+
+    try:
+        img = decode_image(image_b64, current_app.extensions['printer_driver'].profile.dot_width)
+    except Exception as e:
+        return jsonify({"error": f"Could not decode image: {e}"}), 400
+
+    registry = current_app.extensions['logo_registry']
+    if not registry.fits(img, replacing=key):
+        return jsonify({"error": "Not enough printer NV memory for this logo"}), 507
+
+    return jsonify(registry.register(key, img)), 200
+
+
+@v1_bp.route('/logos/<key>', methods=['DELETE'])
+@require_admin
+def delete_logo(key):
+    """Remove a logo from printer NV memory (admin only)."""
+    if not current_app.extensions['logo_registry'].remove(key):
+        return jsonify({"error": "Logo not found"}), 404
+    return jsonify({"status": "deleted", "key": key}), 200
+
+
+@v1_bp.route('/templates', methods=['GET'])
+@require_admin
+def template_stats():
+    """Compile and render timings for each loaded template (admin only)."""
+    return jsonify(current_app.extensions['template_store'].stats()), 200
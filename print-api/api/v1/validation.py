@@ -1,10 +1,25 @@
+import io
 import re
 import base64
+from typing import Optional
+
+from PIL import Image
+
+import config
+from driver.escpos_builder import check_barcode
+from driver.layout import LINE_FONTS, LINE_SIZES, LINE_TYPES, OVERFLOW_MODES
+from print_queue.scheduler import PRIORITY_CLASSES
 
 ALLOWED_ALIGNS = {"left", "center", "right"}
 ALLOWED_FONTS = {"default", "montserrat", "kings"}
+ALLOWED_RENDER_MODES = {"raster", "hybrid"}
+ALLOWED_DITHER_MODES = {"threshold", "bayer", "floyd-steinberg"}
+ALLOWED_PRINT_MODES = {"normal", "draft", "dense"}
 ALLOWED_BARCODE_TYPES = {"CODE39", "CODE128", "EAN13", "EAN8", "UPC-A"}
 MAX_TEXT_LENGTH = 4096
+MAX_LAYOUT_LINES = 500
+MAX_LAYOUT_COLUMNS = 8
+MAX_FEED_LINES = 10
 
 # Matches control characters 0x00-0x1F except newline (0x0A)
 _CONTROL_CHARS = re.compile(r'[\x00-\x09\x0b-\x1f]')
@@ -15,6 +30,131 @@ def sanitize_text(text: str) -> str:
     return _CONTROL_CHARS.sub('', text)
 
 
+def _check_image(image_b64: str) -> Optional[str]:
+    """Return an error message if the image is malformed or over the pixel budget.
+
+    Only the image header is parsed; no pixel data is decoded.
+    """
+    try:
+        image_data = base64.b64decode(image_b64, validate=True)
+    except Exception:
+        return "Invalid base64 image data"
+    try:
+        with Image.open(io.BytesIO(image_data)) as img:
+            width, height = img.size
+    except Exception:
+        return "Unrecognized image format"
+    if width * height > config.IMAGE_MAX_PIXELS:
+        return f"Image is {width}x{height}, over the {config.IMAGE_MAX_PIXELS} pixel limit"
+    return None
+
+
+def _validate_style(item: dict, where: str, cleaned: dict, errors: list):
+    """Size and emphasis fields shared by every layout element."""
+    size = item.get('size', 'normal')
+    if size not in LINE_SIZES:
+        errors.append(f"{where}: invalid size '{size}', must be one of {set(LINE_SIZES)}")
+    else:
+        cleaned['size'] = size
+    if 'bold' in item:
+        cleaned['bold'] = bool(item['bold'])
+    cleaned['underline'] = bool(item.get('underline', False))
+
+
+def _validate_columns(columns, where: str, errors: list) -> list:
+    if not isinstance(columns, list) or not columns:
+        errors.append(f"{where}: columns must be a non-empty list")
+        return []
+    if len(columns) > MAX_LAYOUT_COLUMNS:
+        errors.append(f"{where}: at most {MAX_LAYOUT_COLUMNS} columns")
+        return []
+
+    cleaned = []
+    for n, column in enumerate(columns):
+        at = f"{where}.columns[{n}]"
+        if not isinstance(column, dict):
+            errors.append(f"{at} must be an object")
+            continue
+        cell = {'text': sanitize_text(str(column.get('text', ''))).replace('\n', ' ')}
+        if column.get('width') is not None:
+            width = column['width']
+            if not isinstance(width, int) or isinstance(width, bool) or not 1 <= width <= 255:
+                errors.append(f"{at}.width must be an integer between 1 and 255")
+            else:
+                cell['width'] = width
+        align = column.get('align', 'left')
+        if align not in ALLOWED_ALIGNS:
+            errors.append(f"{at}: invalid align '{align}', must be one of {ALLOWED_ALIGNS}")
+        else:
+            cell['align'] = align
+        overflow = column.get('overflow', 'wrap')
+        if overflow not in OVERFLOW_MODES:
+            errors.append(f"{at}: invalid overflow '{overflow}', must be one of {set(OVERFLOW_MODES)}")
+        else:
+            cell['overflow'] = overflow
+        cleaned.append(cell)
+    return cleaned
+
+
+def validate_lines(lines) -> tuple:
+    """Validate a structured `lines` layout.
+
+    Returns (cleaned_lines, errors).
+    """
+    if not isinstance(lines, list):
+        return [], ["lines must be a list of layout elements"]
+    if len(lines) > MAX_LAYOUT_LINES:
+        return [], [f"lines exceeds {MAX_LAYOUT_LINES} elements"]
+
+    errors = []
+    cleaned = []
+    for n, item in enumerate(lines):
+        where = f"lines[{n}]"
+        if not isinstance(item, dict):
+            errors.append(f"{where} must be an object")
+            continue
+        kind = item.get('type', 'text')
+        if kind not in LINE_TYPES:
+            errors.append(f"{where}: invalid type '{kind}', must be one of {set(LINE_TYPES)}")
+            continue
+
+        element = {'type': kind}
+        if kind == 'feed':
+            count = item.get('lines', 1)
+            if not isinstance(count, int) or isinstance(count, bool) or not 1 <= count <= MAX_FEED_LINES:
+                errors.append(f"{where}.lines must be an integer between 1 and {MAX_FEED_LINES}")
+            else:
+                element['lines'] = count
+            cleaned.append(element)
+            continue
+
+        _validate_style(item, where, element, errors)
+        if kind == 'text':
+            text = str(item.get('text', ''))
+            if len(text) > MAX_TEXT_LENGTH:
+                errors.append(f"{where}.text exceeds {MAX_TEXT_LENGTH} characters")
+            element['text'] = sanitize_text(text)
+            align = item.get('align', 'left')
+            if align not in ALLOWED_ALIGNS:
+                errors.append(f"{where}: invalid align '{align}', must be one of {ALLOWED_ALIGNS}")
+            else:
+                element['align'] = align
+        elif kind == 'separator':
+            char = str(item.get('char', '-'))
+            if len(char) != 1 or not char.isprintable():
+                errors.append(f"{where}.char must be a single printable character")
+            else:
+                element['char'] = char
+        elif kind == 'total':
+            element['label'] = sanitize_text(str(item.get('label', ''))).replace('\n', ' ')
+            element['value'] = sanitize_text(str(item.get('value', ''))).replace('\n', ' ')
+        else:
+            element['columns'] = _validate_columns(item.get('columns'), where, errors)
+        cleaned.append(element)
+
+    return cleaned, errors
+
+
 def validate_print_request(data: dict) -> tuple:
     """Validate and sanitize a structured print request.
 
@@ -24,8 +164,8 @@ def validate_print_request(data: dict) -> tuple:
     cleaned = {}
 
     # At least one content source required
-    if not data.get('text') and not data.get('template') and not data.get('image'):
-        errors.append("At least one of 'text', 'template', or 'image' is required")
+    if not any(data.get(k) for k in ('text', 'lines', 'template', 'image', 'logo')):
+        errors.append("At least one of 'text', 'lines', 'template', 'image', or 'logo' is required")
 
     # Text
     if data.get('text'):
@@ -35,6 +175,18 @@ def validate_print_request(data: dict) -> tuple:
         else:
             cleaned['text'] = sanitize_text(text)
 
+    # Structured layout in the printer's built-in font
+    if data.get('lines'):
+        lines, line_errors = validate_lines(data['lines'])
+        errors.extend(line_errors)
+        if not line_errors:
+            cleaned['lines'] = lines
+        lines_font = data.get('lines_font', 'A')
+        if lines_font not in LINE_FONTS:
+            errors.append(f"Invalid lines_font '{lines_font}', must be one of {set(LINE_FONTS)}")
+        else:
+            cleaned['lines_font'] = lines_font
+
     # Header
     if data.get('header'):
         header = str(data['header'])
@@ -60,6 +212,23 @@ def validate_print_request(data: dict) -> tuple:
     else:
         cleaned['font_style'] = font_style
 
+    # Render mode (custom fonts): rasterize everything, or only what the
+    # printer's built-in font cannot print
+    if data.get('render_mode'):
+        render_mode = data['render_mode']
+        if render_mode not in ALLOWED_RENDER_MODES:
+            errors.append(f"Invalid render_mode '{render_mode}', must be one of {ALLOWED_RENDER_MODES}")
+        else:
+            cleaned['render_mode'] = render_mode
+
+    # Print mode: speed/density trade-off for the whole job
+    if data.get('print_mode'):
+        print_mode = data['print_mode']
+        if print_mode not in ALLOWED_PRINT_MODES:
+            errors.append(f"Invalid print_mode '{print_mode}', must be one of {ALLOWED_PRINT_MODES}")
+        else:
+            cleaned['print_mode'] = print_mode
+
     # Font size
     font_size = data.get('font_size', 24)
     try:
@@ -73,11 +242,27 @@ def validate_print_request(data: dict) -> tuple:
 
     # Image (base64)
     if data.get('image'):
-        try:
-            base64.b64decode(data['image'], validate=True)
+        image_error = _check_image(data['image'])
+        if image_error:
+            errors.append(image_error)
+        else:
             cleaned['image'] = data['image']
-        except Exception:
-            errors.append("Invalid base64 image data")
+
+    # Dithering algorithm for the image
+    if data.get('dither'):
+        dither = data['dither']
+        if dither not in ALLOWED_DITHER_MODES:
+            errors.append(f"Invalid dither '{dither}', must be one of {ALLOWED_DITHER_MODES}")
+        else:
+            cleaned['dither'] = dither
+
+    # Logo key (NV graphics stored via /logos)
+    if data.get('logo'):
+        logo = str(data['logo'])
+        if len(logo) != 2 or not logo.isascii() or not logo.isprintable():
+            errors.append("logo must be a 2-character printable ASCII key")
+        else:
+            cleaned['logo'] = logo
 
     # QR code
     if data.get('qr_code'):
@@ -99,12 +284,22 @@ def validate_print_request(data: dict) -> tuple:
                 errors.append("barcode.data is required")
             if bc_type not in ALLOWED_BARCODE_TYPES:
                 errors.append(f"Invalid barcode type '{bc_type}', must be one of {ALLOWED_BARCODE_TYPES}")
+            elif bc_data and not check_barcode(str(bc_data), bc_type):
+                errors.append(f"barcode.data is not valid {bc_type} data (characters or length)")
             else:
                 cleaned['barcode'] = {'data': str(bc_data), 'type': bc_type}
 
     # Cut
     cleaned['cut'] = bool(data.get('cut', True))
 
+    # Scheduling class; not part of the printed payload
+    if data.get('priority'):
+        priority = data['priority']
+        if priority not in PRIORITY_CLASSES:
+            errors.append(f"Invalid priority '{priority}', must be one of {set(PRIORITY_CLASSES)}")
+        else:
+            cleaned['priority'] = priority
+
     # Template
     if data.get('template'):
         cleaned['template'] = str(data['template'])
@@ -114,12 +309,30 @@ def validate_print_request(data: dict) -> tuple:
     return cleaned, errors
 
 
+def validate_logo_request(data: dict) -> tuple:
+    """Validate a logo upload request.
+
+    Returns (image_b64, errors).
+    """
+    errors = []
+    image = data.get('image')
+    if not image:
+        errors.append("'image' field with base64-encoded image data is required")
+    else:
+        image_error = _check_image(image)
+        if image_error:
+            errors.append(image_error)
+    return image, errors
+
+
 def validate_raw_request(data: dict) -> tuple:
     """Validate a raw ESC/POS print request.
 
     Returns (decoded_bytes, errors).
     """
     errors = []
+    if data.get('priority') and data['priority'] not in PRIORITY_CLASSES:
+        errors.append(f"Invalid priority '{data['priority']}', must be one of {set(PRIORITY_CLASSES)}")
     raw_bytes = b''
 
     if not data.get('data'):
@@ -0,0 +1,422 @@
+"""Micro-benchmarks for the print pipeline.
+
+Usage:
+    python bench.py raster [--repeat N]
+    python bench.py render [--repeat N]
+    python bench.py transmit
+    python bench.py dither [--repeat N]
+    python bench.py stream
+    python bench.py pipeline
+    python bench.py pool [--workers N]
+    python bench.py registry
+
+The transmit benchmark replays a job through a simple device emulator and
+reports bytes on the wire and modeled print time for each profile.
+
+The raster benchmark checks that the fast path produces the same bytes as
+the reference implementation before reporting timings.
+"""
+import argparse
+import base64
+import io
+import os
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+from escpos.printer import Dummy
+
+from driver import dither, raster, renderer
+from driver.escpos_builder import build_escpos_commands, iter_escpos_commands
+from driver.printer import PrinterDriver
+from driver.profiles import PrinterProfile, get_profile
+from driver.render_pool import RenderPool
+from driver.renderer import render_text_to_image
+from print_queue import JobQueue, JobRegistry, PrintJob, JobState
+
+RECEIPT_LINES = [
+    "Flat white                    3.80",
+    "Almond croissant              2.95",
+    "Sparkling water 500ml         1.50",
+    "Subtotal                      8.25",
+]
+
+
+def _timeit(fn, repeat: int) -> float:
+    """Best-of-N wall time in milliseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def _dummy_image(img: Image.Image) -> bytes:
+    dummy = Dummy()
+    dummy.image(img)
+    return dummy.output
+
+
+def bench_raster(repeat: int):
+    """Dummy().image() vs raster.encode_raster() on typical job images."""
+    rng = np.random.default_rng(0)
+    samples = {
+        'receipt text': render_text_to_image(
+            "Item line with a price   12.50\n" * 40, font_size=24),
+        'header': render_text_to_image(
+            "STORE NAME", bold=True, font_size=48, align='center'),
+        'photo 512px': Image.fromarray(
+            rng.integers(0, 256, (680, 512), dtype=np.uint8)).convert('RGB'),
+    }
+    print(f"{'image':<14} {'size':>10} {'dummy ms':>10} {'numpy ms':>10} {'speedup':>8}")
+    for name, img in samples.items():
+        if _dummy_image(img) != raster.encode_raster(img):
+            raise SystemExit(f"{name}: encoder output differs from Dummy().image()")
+        ref = _timeit(lambda: _dummy_image(img), repeat)
+        fast = _timeit(lambda: raster.encode_raster(img), repeat)
+        size = f"{img.width}x{img.height}"
+        print(f"{name:<14} {size:>10} {ref:>10.2f} {fast:>10.2f} {ref / fast:>7.1f}x")
+
+
+def _draw_lines(lines, font, line_height: int) -> Image.Image:
+    """Pre-atlas rendering: FreeType rasterizes every glyph on every call."""
+    img = Image.new('RGB', (512, len(lines) * line_height + 20), color='white')
+    draw = ImageDraw.Draw(img)
+    for i, line in enumerate(lines):
+        draw.text((0, 10 + i * line_height), line, font=font, fill='black')
+    return img
+
+
+def bench_render(repeat: int):
+    """ImageDraw.text per line vs glyph-atlas blitting, 40-line receipt."""
+    lines = RECEIPT_LINES * 10
+    text = "\n".join(lines)
+    print(f"{'font':<18} {'imagedraw ms':>13} {'atlas ms':>10} {'speedup':>8}")
+    for style, bold, size in (('montserrat', False, 24), ('montserrat', True, 32),
+                              ('kings', False, 48)):
+        font = renderer._get_font(style, bold, size)
+        render_text_to_image(text, font_style=style, bold=bold, font_size=size)
+        ref = _timeit(lambda: _draw_lines(lines, font, int(size * 1.2)), repeat)
+        fast = _timeit(lambda: render_text_to_image(
+            text, font_style=style, bold=bold, font_size=size), repeat)
+        name = f"{style} {size}{' bold' if bold else ''}"
+        print(f"{name:<18} {ref:>13.2f} {fast:>10.2f} {ref / fast:>7.1f}x")
+    print(f"atlas: {len(renderer._atlas)} glyphs, {renderer._atlas.size_bytes} bytes")
+
+
+class DeviceEmulator:
+    """Timing model of a printer fed over a link with a finite receive buffer.
+
+    Raster blocks that fit the buffer are double-buffered: the next block
+    streams in while the current one prints. A block larger than the buffer
+    is printed in buffer-sized bursts, each waiting for its data, and every
+    time the head runs out of data it pays a motor restart penalty.
+    """
+
+    def __init__(
+        self,
+        link_bytes_s: float,
+        buffer_bytes: int,
+        print_speed: float = raster.RASTER_SPEED_MM_S,
+        restart_ms: float = 15.0,
+        dpi: int = raster.DEFAULT_DPI,
+        motion_units: int = raster.DEFAULT_DPI,
+    ):
+        self.link_bytes_s = link_bytes_s
+        self.buffer_bytes = buffer_bytes
+        self.print_speed = print_speed
+        self.dpi = dpi
+        self.motion_units = motion_units
+        self.restart_ms = restart_ms
+
+    @staticmethod
+    def _parse(data: bytes):
+        """Yield (wire bytes, printed rows) per raster block, or
+        (wire bytes, -motion units) per paper feed."""
+        i, other = 0, 0
+        while i < len(data):
+            if data.startswith(b"\x1dv0", i):
+                width = int.from_bytes(data[i + 4:i + 6], 'little')
+                rows = int.from_bytes(data[i + 6:i + 8], 'little')
+                size = 8 + width * rows
+                yield size + other, rows
+                i, other = i + size, 0
+            elif data.startswith(b"\x1bJ", i):
+                yield 3 + other, -data[i + 2]
+                i, other = i + 3, 0
+            else:
+                i, other = i + 1, other + 1
+        if other:
+            yield other, 0
+
+    def run(self, data: bytes) -> float:
+        """Modeled milliseconds from first byte sent to last row printed."""
+        row_ms = raster.row_ms(self.print_speed, self.dpi)
+        feed_ms = raster.row_ms(max(raster.FEED_SPEED_MM_S, self.print_speed), self.motion_units)
+        byte_ms = 1000.0 / self.link_bytes_s
+        arrived = head_free = 0.0
+        for size, rows in self._parse(data):
+            if size <= self.buffer_bytes:
+                # Streams in while the previous block prints
+                arrived += size * byte_ms
+                print_ms = rows * row_ms if rows >= 0 else -rows * feed_ms
+                if arrived > head_free and rows:
+                    head_free = arrived + self.restart_ms
+                head_free = max(head_free, arrived) + print_ms
+                continue
+            # Oversized block: fill the buffer, print it, repeat
+            chunks = -(-size // self.buffer_bytes)
+            for _ in range(chunks):
+                arrived = max(arrived, head_free) + self.buffer_bytes * byte_ms
+                head_free = arrived + self.restart_ms + rows / chunks * row_ms
+        return max(arrived, head_free)
+
+
+def bench_transmit(repeat: int):
+    """Bytes on the wire and modeled print time, legacy vs buffer-sized bands."""
+    rng = np.random.default_rng(0)
+    photo = Image.fromarray(rng.integers(0, 256, (680, 512), dtype=np.uint8))
+    buf = io.BytesIO()
+    photo.save(buf, format='PNG')
+    payload = {
+        'header': 'STORE NAME',
+        'image': base64.b64encode(buf.getvalue()).decode(),
+        'text': "\n".join(RECEIPT_LINES * 10),
+        'qr_code': 'https://example.com/receipt/1234',
+    }
+    links = (('serial 115200', 11_520), ('usb 1 MB/s', 1_000_000))
+    print(f"{'profile':<16} {'bytes':>8} " + " ".join(f"{n + ' ms':>16}" for n, _ in links))
+    for buffer_bytes in (4096, 16384, 65536):
+        legacy = PrinterProfile('legacy-960', receive_buffer=1 << 30)
+        banded = PrinterProfile(f'banded-{buffer_bytes // 1024}k', receive_buffer=buffer_bytes)
+        for profile in (legacy, banded):
+            data = build_escpos_commands(payload, {}, profile)
+            times = [DeviceEmulator(rate, buffer_bytes).run(data) for _, rate in links]
+            label = f"{profile.name}@{buffer_bytes // 1024}k" if profile is legacy else profile.name
+            print(f"{label:<16} {len(data):>8} " + " ".join(f"{t:>16.0f}" for t in times))
+
+
+def _photo(height: int = 680, width: int = 512) -> np.ndarray:
+    """Smooth gradients plus sensor-like noise, a stand-in for a phone photo."""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width]
+    tone = 128 + 100 * np.sin(x / 40) * np.cos(y / 55)
+    return (tone + 20 * rng.standard_normal((height, width))).clip(0, 255).astype(np.uint8)
+
+
+def bench_dither(repeat: int):
+    """Each dithering mode on a 512px-wide photo, timing and tone error.
+
+    Tone error is the RMS difference between the blurred output and the
+    blurred source, roughly what the eye sees at arm's length.
+    """
+    gray = _photo()
+    ref = np.asarray(Image.fromarray(gray).filter(ImageFilter.GaussianBlur(2)), dtype=float)
+    print(f"{'mode':<16} {'ms':>8} {'tone err':>9}")
+    for name in dither.DITHER_MODES:
+        ms = _timeit(lambda: raster.pack_bitmap(dither.dither(gray, name)), repeat)
+        dots = dither.dither(gray, name)
+        out = Image.fromarray(np.where(dots, 0, 255).astype(np.uint8))
+        blurred = np.asarray(out.filter(ImageFilter.GaussianBlur(2)), dtype=float)
+        err = np.sqrt(((blurred - ref) ** 2).mean())
+        print(f"{name:<16} {ms:>8.2f} {err:>9.2f}")
+
+
+def bench_stream(repeat: int):
+    """Time to first paper and peak memory for long templated reports.
+
+    'first chunk' is when the first body-text bytes are ready for the
+    printer; 'total' is the whole document. Peak memory is measured
+    while consuming the stream chunk by chunk, as the driver does.
+    """
+    print(f"{'items':>6} {'first chunk ms':>15} {'total ms':>10} {'bytes':>9} {'peak KiB':>9}")
+    for count in (50, 500, 2000):
+        payload = {
+            'template': 'receipt',
+            'template_data': {
+                'items': [{'name': f"Item {i} \u00e9", 'price': f"{i}.00"} for i in range(count)],
+                'total': '0.00',
+            },
+            'font_style': 'montserrat',
+            'render_mode': 'raster',
+        }
+        build_escpos_commands(payload)  # warm glyph and template caches
+
+        start = time.perf_counter()
+        chunks = iter_escpos_commands(payload)
+        next(chunks)  # init, alignment
+        next(chunks)
+        first = (time.perf_counter() - start) * 1000
+        size = sum(len(chunk) for chunk in chunks)
+        total = (time.perf_counter() - start) * 1000
+
+        tracemalloc.start()
+        for _ in iter_escpos_commands(payload):
+            pass
+        peak = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+        print(f"{count:>6} {first:>15.2f} {total:>10.2f} {size:>9} {peak:>9.0f}")
+
+
+class _SlowDriver(PrinterDriver):
+    """Dummy printer that takes `byte_ms` per byte to accept data and
+    records how long the link was busy."""
+
+    def __init__(self, byte_ms: float):
+        super().__init__('bench', 'dummy')
+        self._byte_ms = byte_ms
+        self.busy = 0.0
+
+    def _write(self, data: bytes):
+        start = time.perf_counter()
+        time.sleep(len(data) * self._byte_ms / 1000)
+        self.busy += time.perf_counter() - start
+
+
+def bench_pipeline(repeat: int):
+    """A burst of custom-font receipts through the queue, serial vs pipelined.
+
+    'idle' is the time the printer link waited on rendering, whether
+    between jobs or between the chunks of one job.
+    """
+    jobs = 8
+    batch_payloads = [
+        {
+            'header': 'STORE NAME',
+            'text': "\n".join(f"{line} #{n}-{i}" for i, line in enumerate(RECEIPT_LINES * 6)),
+            'font_style': 'montserrat',
+            'qr_code': f'https://example.com/receipt/{n}',
+        }
+        for n in range(jobs)
+    ]
+    print(f"{'mode':<10} {'total ms':>9} {'idle ms':>8} {'link busy':>10}")
+    for label, pipelined in (('serial', False), ('pipelined', True)):
+        driver = _SlowDriver(byte_ms=0.002)
+        queue = JobQueue(max_depth=jobs)
+        queue.start(driver.print_job, driver.render_job if pipelined else None)
+        batch = [PrintJob(payload=dict(payload)) for payload in batch_payloads]
+        start = time.perf_counter()
+        for job in batch:
+            queue.submit(job)
+        while any(job.state in (JobState.QUEUED, JobState.PRINTING) for job in batch):
+            time.sleep(0.001)
+        total = time.perf_counter() - start
+        queue.stop()
+        idle = total - driver.busy
+        print(f"{label:<10} {total * 1000:>9.1f} {idle * 1000:>8.1f} {driver.busy / total:>10.0%}")
+
+
+def _pool_payloads(count: int):
+    """Distinct custom-font receipts with a photo, so no two share cached output."""
+    buf = io.BytesIO()
+    Image.fromarray(_photo(400)).save(buf, format='PNG')
+    image = base64.b64encode(buf.getvalue()).decode()
+    return [
+        {
+            'header': f'STORE {n}',
+            'text': "\n".join(f"{line} #{n}-{i}" for i, line in enumerate(RECEIPT_LINES * 6)),
+            'font_style': 'montserrat',
+            'image': image,
+        }
+        for n in range(count)
+    ]
+
+
+def bench_pool(repeat: int, workers: int = 0):
+    """Render throughput in-process vs a process pool of 1..N workers.
+
+    Each pool's output is checked against the in-process bytes first.
+    """
+    workers = workers or os.cpu_count() or 1
+    payloads = _pool_payloads(24)
+    profile = get_profile()
+    start = time.perf_counter()
+    expected = [build_escpos_commands(payload, {}, profile) for payload in payloads]
+    baseline = len(payloads) / (time.perf_counter() - start)
+    print(f"{os.cpu_count()} CPUs")
+    print(f"{'workers':>8} {'jobs/s':>8} {'speedup':>8}")
+    print(f"{'in-proc':>8} {baseline:>8.1f} {1:>8.2f}")
+    for count in range(1, workers + 1):
+        pool = RenderPool(count)
+        pool.warm()
+        try:
+            start = time.perf_counter()
+            futures = [pool.submit(payload, profile, {}) for payload in payloads]
+            results = [future.result() for future in futures]
+            rate = len(payloads) / (time.perf_counter() - start)
+        finally:
+            pool.stop()
+        assert results == expected, "pool output differs from in-process rendering"
+        print(f"{count:>8} {rate:>8.1f} {rate / baseline:>8.2f}")
+
+
+def _finish_dict_scan(jobs: dict, job: PrintJob, max_age: float = 300.0):
+    """The previous JobQueue bookkeeping: keep whole jobs, rescan on every finish."""
+    now = job.completed_at
+    stale = [jid for jid, j in jobs.items()
+             if j.completed_at and (now - j.completed_at) > max_age]
+    for jid in stale:
+        del jobs[jid]
+
+
+def bench_registry(repeat: int):
+    """An hour of 100k jobs (each with a 12 KB image) through the job
+    lookup: old dict-and-scan vs JobRegistry, on a simulated clock.
+
+    'kept' is how many finished jobs are still queryable at the end.
+    """
+    jobs = 100_000
+    interval = 3600.0 / jobs
+    image = base64.b64encode(bytes(9 * 1024)).decode()
+    print(f"{'registry':<10} {'us/job':>8} {'peak MiB':>9} {'kept':>7}")
+    for label in ('dict-scan', 'compact'):
+        registry, table = JobRegistry(), {}
+        tracemalloc.start()
+        start = time.perf_counter()
+        for n in range(jobs):
+            job = PrintJob(payload={'text': 'x', 'image': image + str(n)},
+                           metrics={'print_mode': 'normal', 'render_ms': 1.0})
+            job.state = JobState.DONE
+            job.completed_at = n * interval
+            if label == 'compact':
+                registry.add(job)
+                registry.finish(job)
+            else:
+                table[job.id] = job
+                _finish_dict_scan(table, job)
+            if label == 'dict-scan' and n == 20_000:
+                # Each finish rescans ~8k jobs; extrapolate instead of waiting
+                break
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+        done = n + 1
+        kept = len(table) if label == 'dict-scan' else registry.stats()['finished']
+        print(f"{label:<10} {elapsed / done * 1e6:>8.1f} {peak:>9.1f} {kept:>7}")
+
+
+BENCHMARKS = {
+    'raster': bench_raster,
+    'render': bench_render,
+    'transmit': bench_transmit,
+    'dither': bench_dither,
+    'stream': bench_stream,
+    'pipeline': bench_pipeline,
+    'pool': bench_pool,
+    'registry': bench_registry,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=0,
+                        help="pool: largest worker count (default: CPU count)")
+    args = parser.parse_args()
+    if args.benchmark == 'pool':
+        bench_pool(args.repeat, args.workers)
+    else:
+        BENCHMARKS[args.benchmark](args.repeat)
@@ -16,6 +16,17 @@ else:
     PRINTER_DEVICE = os.getenv('PRINTER_NAME', 'Generic / Text Only')
     PRINTER_BACKEND = os.getenv('PRINTER_BACKEND', 'dummy')
 
+# Capability profile name (see driver/profiles.py)
+PRINTER_PROFILE = os.getenv('PRINTER_PROFILE', 'default')
+
+# Printer supports ESC & user-defined characters (custom fonts as text)
+PRINTER_UDC = os.getenv('PRINTER_UDC', 'False').lower() in ('true', '1', 't')
+
+# NV graphics logo store (manifest of logos defined in printer memory)
+LOGO_STORE_FILE = os.getenv('LOGO_STORE_FILE', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'logos.json'))
+LOGO_NV_CAPACITY = int(os.getenv('LOGO_NV_CAPACITY', 256 * 1024))
+
 # Server Configuration
 HOST = os.getenv('HOST', '0.0.0.0')
 PORT = int(os.getenv('PORT', 8080))
@@ -27,11 +38,62 @@ ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
 
 # Queue Configuration
 QUEUE_MAX_DEPTH = int(os.getenv('QUEUE_MAX_DEPTH', 20))
+# Capacity of the urgent and bulk priority classes (normal uses
+# QUEUE_MAX_DEPTH), and the fraction of a class one client may fill
+QUEUE_URGENT_DEPTH = int(os.getenv('QUEUE_URGENT_DEPTH', QUEUE_MAX_DEPTH))
+QUEUE_BULK_DEPTH = int(os.getenv('QUEUE_BULK_DEPTH', 100))
+QUEUE_CLIENT_SHARE = float(os.getenv('QUEUE_CLIENT_SHARE', 1.0))
+# Fair-queuing weights by client IP, e.g. "10.0.0.5=2,10.0.0.6=0.5"
+QUEUE_CLIENT_WEIGHTS = {
+    ip.strip(): float(weight)
+    for ip, weight in (
+        item.split('=', 1) for item in os.getenv('QUEUE_CLIENT_WEIGHTS', '').split(',') if '=' in item
+    )
+}
 JOB_TIMEOUT = float(os.getenv('JOB_TIMEOUT', 30.0))
+# Finished jobs stay queryable via /status for this long, capped by count
+# and by estimated memory (payloads are dropped when a job finishes)
+JOB_HISTORY_SECONDS = float(os.getenv('JOB_HISTORY_SECONDS', 300.0))
+JOB_HISTORY_MAX_ENTRIES = int(os.getenv('JOB_HISTORY_MAX_ENTRIES', 10000))
+JOB_HISTORY_MAX_BYTES = int(os.getenv('JOB_HISTORY_MAX_BYTES', 8 * 1024 * 1024))
+# Jobs rendered ahead of the printer while it prints the current one
+# (0 renders each job only when its turn comes), and the most rendered
+# bytes allowed to wait for the printer
+RENDER_AHEAD = int(os.getenv('RENDER_AHEAD', 2))
+RENDER_BUFFER_BYTES = int(os.getenv('RENDER_BUFFER_BYTES', 4 * 1024 * 1024))
+# Worker processes rendering jobs in parallel (0 renders in the server
+# process). Each worker holds its own font and template caches.
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', 0))
+# Durable job journal (SQLite, WAL mode): queued jobs are printed after a
+# restart. Empty disables it.
+JOB_JOURNAL_FILE = os.getenv('JOB_JOURNAL_FILE', '')
+# Bulk mail-merge: largest uploaded JSONL/CSV body, and how many of a
+# run's rows may sit in the queue at once (regular jobs go between them)
+MERGE_MAX_BYTES = int(os.getenv('MERGE_MAX_BYTES', 16 * 1024 * 1024))
+MERGE_INFLIGHT = int(os.getenv('MERGE_INFLIGHT', 2))
+# Print mode for jobs that don't choose one: normal, draft or dense
+PRINT_MODE = os.getenv('PRINT_MODE', 'normal')
 
 # Rate Limiting
 RATE_LIMIT = os.getenv('RATE_LIMIT', '10 per minute')
 MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', 65536))
+# Largest image (width x height) accepted for decoding; guards against
+# decompression bombs. 24 MP covers full-resolution phone photos.
+IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', 24_000_000))
+
+# Rendering
+# Glyph atlas budget. Printable ASCII at every validated font size
+# (12-72) of all three font files takes about 3 MiB; the rest is room
+# for accented and symbol glyphs.
+GLYPH_CACHE_BYTES = int(os.getenv('GLYPH_CACHE_BYTES', 16 * 1024 * 1024))
+# Number of wrapped paragraphs kept for reuse
+WRAP_CACHE_SIZE = int(os.getenv('WRAP_CACHE_SIZE', 4096))
+# Pre-rasterized static template lines kept across jobs
+FRAGMENT_CACHE_SIZE = int(os.getenv('FRAGMENT_CACHE_SIZE', 1024))
+# Raster QR/barcode renderings kept for reprints (raster-only printers)
+CODE_CACHE_SIZE = int(os.getenv('CODE_CACHE_SIZE', 128))
+# Dot rows per raster band sent to the printer while rendering continues
+RASTER_BAND_ROWS = int(os.getenv('RASTER_BAND_ROWS', 256))
 
 # Logging
 LOG_FILE = os.getenv('LOG_FILE', '')
@@ -41,3 +103,8 @@ LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 FONT_DIR = os.path.join(BASE_DIR, 'fonts')
 TEMPLATE_DIR = os.path.join(BASE_DIR, 'templates')
+
+# Templates: Jinja2 bytecode cache location (empty = no disk cache) and
+# how often to check templates/ for edits, in seconds (0 = never)
+TEMPLATE_CACHE_DIR = os.getenv('TEMPLATE_CACHE_DIR', os.path.join(BASE_DIR, '.template_cache'))
+TEMPLATE_RELOAD_INTERVAL = float(os.getenv('TEMPLATE_RELOAD_INTERVAL', 2.0))
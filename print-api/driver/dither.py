@@ -0,0 +1,56 @@
+"""Vectorized dithering for uploaded images.
+
+Every mode maps an 8-bit grayscale array (0 = black) to a boolean dot
+array (True = black) that raster.pack_bitmap() accepts directly:
+
+- threshold: hard cut at mid-gray; best for logos and line art.
+- bayer: 8x8 ordered dither; stable patterns that survive thermal bleed.
+- floyd-steinberg: Pillow's C implementation, the python-escpos default.
+"""
+import logging
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODE = 'floyd-steinberg'
+
+_BAYER_8 = np.array([
+    [0, 32, 8, 40, 2, 34, 10, 42],
+    [48, 16, 56, 24, 50, 18, 58, 26],
+    [12, 44, 4, 36, 14, 46, 6, 38],
+    [60, 28, 52, 20, 62, 30, 54, 22],
+    [3, 35, 11, 43, 1, 33, 9, 41],
+    [51, 19, 59, 27, 49, 17, 57, 25],
+    [15, 47, 7, 39, 13, 45, 5, 37],
+    [63, 31, 55, 23, 61, 29, 53, 21],
+])
+_BAYER_THRESHOLDS = ((_BAYER_8 + 0.5) * (255 / 64)).astype(np.float32)
+
+
+def threshold(gray: np.ndarray) -> np.ndarray:
+    return gray < 128
+
+
+def bayer(gray: np.ndarray) -> np.ndarray:
+    height, width = gray.shape
+    tiles = np.tile(_BAYER_THRESHOLDS, (-(-height // 8), -(-width // 8)))
+    return gray < tiles[:height, :width]
+
+
+def floyd_steinberg(gray: np.ndarray) -> np.ndarray:
+    # Dither the inverted image, as python-escpos does, so ties round the same way
+    return np.asarray(Image.fromarray(255 - gray).convert('1'))
+
+
+DITHER_MODES = {
+    'threshold': threshold,
+    'bayer': bayer,
+    'floyd-steinberg': floyd_steinberg,
+}
+
+
+def dither(gray: np.ndarray, mode: str = DEFAULT_MODE) -> np.ndarray:
+    """Convert a grayscale array to black dots with the named algorithm."""
+    return DITHER_MODES[mode](gray)
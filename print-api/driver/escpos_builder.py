@@ -1,20 +1,32 @@
 """Converts validated print job payloads into ESC/POS byte sequences.
 
 Consolidates all ESC/POS byte construction from the original print_server_win32.py.
-Uses python-escpos Dummy printer for image and barcode rendering.
+Bit images go through the NumPy encoder in raster.py. QR codes and
+barcodes use the printer's native commands when its profile allows, and
+cached raster renderings otherwise.
 """
 import os
 import io
 import base64
+import functools
+import itertools
 import logging
-from typing import Optional
+from typing import AbstractSet, Iterable, Iterator, List, Optional, Set, Tuple
 
+import numpy as np
+import qrcode
 from PIL import Image
 from escpos.printer import Dummy
-from jinja2 import Environment, FileSystemLoader
 
 import config
-from .renderer import render_text_to_image
+from . import udc
+from .dither import DEFAULT_MODE as DEFAULT_DITHER, dither
+from .layout import compile_lines
+from .logos import print_command as logo_print_command
+from .profiles import PrinterProfile, get_profile
+from .raster import BlankRowTrimmer, encode_packed, pack_bitmap, to_gray
+from .renderer import iter_text_bands, render_text_to_raster
+from .template_store import RASTER_MARK, get_store as get_template_store
 
 logger = logging.getLogger(__name__)
 
@@ -29,42 +41,104 @@ ESC_DOUBLE_SIZE = b"\x1B\x21\x30"
 ESC_NORMAL_SIZE = b"\x1B\x21\x00"
 GS_CUT = b"\x1D\x56\x00"
 
-ALIGN_MAP = {"left": ESC_LEFT, "center": ESC_CENTER, "right": ESC_RIGHT}
-
-# Jinja2 environment for receipt templates
-_jinja_env: Optional[Environment] = None
-
-
-def _get_jinja_env() -> Environment:
-    global _jinja_env
-    if _jinja_env is None:
-        _jinja_env = Environment(
-            loader=FileSystemLoader(config.TEMPLATE_DIR),
-            autoescape=False,
-        )
-    return _jinja_env
-
-
-def _image_to_escpos(img: Image.Image) -> bytes:
-    """Convert a PIL Image to ESC/POS image bytes using Dummy printer."""
-    dummy = Dummy()
-    dummy.image(img)
-    return dummy.output
+GS_QR = b"\x1D\x28\x6B"
 
+ALIGN_MAP = {"left": ESC_LEFT, "center": ESC_CENTER, "right": ESC_RIGHT}
 
-def _build_header(header: str, font_style: str, font_size: int) -> bytes:
+# QR code module size (dots) and error correction level
+QR_SIZE = 6
+QR_EC = 'L'
+QR_EC_LEVELS = {'L': b"0", 'M': b"1", 'Q': b"2", 'H': b"3"}
+
+# 1D barcodes: bar height (dots), module width, GS k function B system codes
+BARCODE_HEIGHT = 50
+BARCODE_WIDTH = 2
+BARCODE_SYSTEMS = {
+    'UPC-A': 65,
+    'EAN13': 67,
+    'EAN8': 68,
+    'CODE39': 69,
+    'CODE128': 73,
+}
+
+# GS ( K print control: pL=2, pH=0, then function and parameter
+GS_PRINT_CONTROL = b"\x1D\x28\x4B\x02\x00"
+FN_PRINT_DENSITY = 0x31  # m: 0 = standard, 1-6 darker, 250-255 lighter
+FN_PRINT_SPEED = 0x32  # m: 0 = memory switch setting, 1 = slowest
+
+# Print modes: (speed, density steps). Speed is 'fast' for the profile's
+# top level or 'slow' for level 1; density is relative to standard.
+PRINT_MODES = {
+    'normal': (None, 0),
+    'draft': ('fast', -2),  # high-volume tickets: faster, lighter
+    'dense': ('slow', 3),  # logos and images: darker, cleaner fills
+}
+
+
+def _print_mode_commands(mode: str, profile: PrinterProfile) -> Tuple[bytes, bytes]:
+    """GS ( K commands that enter a print mode, and those that restore defaults.
+
+    Settings the profile does not support are skipped.
+    """
+    speed, density = PRINT_MODES.get(mode, PRINT_MODES['normal'])
+    enter, restore = b"", b""
+    if speed and profile.speed_levels:
+        level = profile.speed_levels if speed == 'fast' else 1
+        enter += GS_PRINT_CONTROL + bytes((FN_PRINT_SPEED, level))
+        restore += GS_PRINT_CONTROL + bytes((FN_PRINT_SPEED, 0))
+    if density and profile.density_control:
+        enter += GS_PRINT_CONTROL + bytes((FN_PRINT_DENSITY, density % 256))
+        restore += GS_PRINT_CONTROL + bytes((FN_PRINT_DENSITY, 0))
+    return enter, restore
+
+
+def _record_savings(metrics: dict, trimmer: BlankRowTrimmer):
+    """Accumulate blank-row trimming savings into the job metrics."""
+    metrics['raster_bytes_saved'] = metrics.get('raster_bytes_saved', 0) + trimmer.bytes_saved
+    metrics['print_ms_saved'] = round(
+        metrics.get('print_ms_saved', 0.0) + trimmer.print_ms_saved, 1)
+
+
+def _encode_bands(
+    bands: Iterable[np.ndarray], metrics: dict, profile: PrinterProfile,
+) -> Iterator[bytes]:
+    """Encode packed raster bands with blank rows cropped or turned into feeds.
+
+    Raster blocks are sized to the printer's receive buffer.
+    """
+    trimmer = None
+    for band in bands:
+        if trimmer is None:
+            trimmer = BlankRowTrimmer(profile.raster_rows(band.shape[1]), profile.print_speed,
+                                      profile.dpi, profile.motion_units)
+        data = trimmer.encode(band)
+        if data:
+            yield data
+    if trimmer is not None:
+        trimmer.finish()
+        _record_savings(metrics, trimmer)
+
+
+def _encode_raster(packed: np.ndarray, metrics: dict, profile: PrinterProfile) -> bytes:
+    return b"".join(_encode_bands([packed], metrics, profile))
+
+
+def _build_header(
+    header: str, font_style: str, font_size: int, metrics: dict, profile: PrinterProfile,
+) -> bytes:
     """Build ESC/POS bytes for a header line."""
     if font_style in ('montserrat', 'kings'):
-        img = render_text_to_image(
+        raster = render_text_to_raster(
             header,
             font_style=font_style,
             bold=True,
+            width=profile.dot_width,
             font_size=max(font_size, 32),
             align='center',
         )
-        if img:
+        if raster is not None:
             commands = ESC_CENTER
-            commands += _image_to_escpos(img)
+            commands += _encode_raster(raster, metrics, profile)
             commands += b"\n\n"
             return commands
 
@@ -76,84 +150,402 @@ def _build_header(header: str, font_style: str, font_size: int) -> bytes:
     return commands
 
 
-def _build_image(image_b64: str) -> bytes:
-    """Decode a base64 image and convert to ESC/POS."""
+def decode_image(image_b64: str, max_width: int = 512) -> Image.Image:
+    """Decode a base64 image and scale it down to the printable width.
+
+    Only the header is parsed before the pixel-budget check, so oversized
+    images are rejected before any pixel data is decoded. JPEGs are then
+    decoded in draft mode: straight to grayscale at the smallest 1/2, 1/4
+    or 1/8 scale that is still at least max_width wide.
+    """
+    image_data = base64.b64decode(image_b64)
+    img = Image.open(io.BytesIO(image_data))
+    if img.width * img.height > config.IMAGE_MAX_PIXELS:
+        raise ValueError(f"Image is {img.width}x{img.height}, over the "
+                         f"{config.IMAGE_MAX_PIXELS} pixel limit")
+
+    if img.width > max_width:
+        ratio = max_width / img.width
+        new_height = int(img.height * ratio)
+        img.draft('L', (max_width, new_height))
+        img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
+    return img
+
+
+def _build_logo(key: str) -> bytes:
+    """Print a logo stored in printer NV memory (see logos.py)."""
+    return ESC_CENTER + logo_print_command(key) + b"\n"
+
+
+def _pack_image(img: Image.Image, dither_mode: Optional[str]) -> np.ndarray:
+    """Dither a decoded image into packed raster rows.
+
+    Without an explicit mode, 1-bit and palette images (logos, line art)
+    are thresholded rather than dithered; everything else gets the
+    default Floyd-Steinberg, byte-identical to python-escpos.
+    """
+    if dither_mode is None:
+        if img.mode == '1':
+            return pack_bitmap(img)
+        if img.mode == 'P':
+            return pack_bitmap(dither(to_gray(img), 'threshold'))
+        dither_mode = DEFAULT_DITHER
+    if dither_mode == DEFAULT_DITHER:
+        # Per-fragment Pillow dithering, as python-escpos does
+        return pack_bitmap(img)
+    return pack_bitmap(dither(to_gray(img), dither_mode))
+
+
+def _build_image(
+    image_b64: str, metrics: dict, profile: PrinterProfile, dither_mode: Optional[str] = None,
+) -> bytes:
+    """Decode a base64 image, dither it and convert to ESC/POS."""
     try:
-        image_data = base64.b64decode(image_b64)
-        img = Image.open(io.BytesIO(image_data))
-
-        max_width = 512
-        if img.width > max_width:
-            ratio = max_width / img.width
-            new_height = int(img.height * ratio)
-            img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
-
-        return _image_to_escpos(img) + b"\n"
+        img = decode_image(image_b64, profile.dot_width)
+        return _encode_raster(_pack_image(img, dither_mode), metrics, profile) + b"\n"
     except Exception as e:
         logger.error("Image processing failed: %s", e)
         return b""
 
 
-def _build_text(text: str, font_style: str, font_size: int, align: str, bold: bool) -> bytes:
-    """Build ESC/POS bytes for body text."""
-    if font_style in ('montserrat', 'kings'):
-        img = render_text_to_image(
-            text,
-            font_style=font_style,
-            bold=bold,
-            font_size=font_size,
-            align=align,
-        )
-        if img:
-            return _image_to_escpos(img) + b"\n"
-
-    # Default: plain UTF-8 text
-    return text.encode('utf-8') + b"\n"
-
-
-def _build_qr(qr_data: str) -> bytes:
-    """Build ESC/POS bytes for a QR code using Dummy printer."""
-    dummy = Dummy()
-    dummy.set(align='center')
-    dummy.qr(qr_data, size=6)
-    return dummy.output + b"\n"
-
+def _encodable(line: str, code_page: str) -> bool:
+    """True if the built-in font's code page has every character of line."""
+    try:
+        line.encode(code_page)
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+def _unmark(lines: Iterable[str]) -> Iterator[str]:
+    """Lines with the template `raster` filter's marker removed."""
+    for line in lines:
+        yield line[1:] if line.startswith(RASTER_MARK) else line
+
+
+# Plain and user-defined-character text is sent in pieces of about this
+# many characters, so long documents never sit in memory whole
+TEXT_CHUNK_CHARS = 4096
+
+
+def _split_lines(chunks: Iterable[str]) -> Iterator[str]:
+    """Re-split a stream of text chunks into lines, like str.split('\\n')."""
+    tail = ''
+    for chunk in chunks:
+        lines = (tail + chunk).split('\n')
+        tail = lines.pop()
+        yield from lines
+    yield tail
+
+
+def _batch_lines(lines: Iterable[str]) -> Iterator[str]:
+    """Join lines back into newline-separated pieces of ~TEXT_CHUNK_CHARS."""
+    batch, size = [], 0
+    for line in lines:
+        batch.append(line)
+        size += len(line) + 1
+        if size >= TEXT_CHUNK_CHARS:
+            yield '\n'.join(batch)
+            batch, size = [], 0
+    if batch:
+        yield '\n'.join(batch)
+
+
+def _iter_raster_text(
+    lines: Iterable[str],
+    font_style: str,
+    font_size: int,
+    align: str,
+    bold: bool,
+    metrics: dict,
+    profile: PrinterProfile,
+    static_lines: AbstractSet[str] = frozenset(),
+) -> Iterator[bytes]:
+    """Yield raster bands for lines in a custom font, then a line feed.
+
+    Falls back to plain UTF-8 text if rendering fails before any output.
+    """
+    # Lines read before the first band, kept for the fallback
+    head: Optional[List[str]] = []
+
+    def _tap(lines):
+        for line in lines:
+            if head is not None:
+                head.append(line)
+            yield line
+
+    remaining = iter(lines)
+    bands = iter_text_bands(
+        _tap(remaining),
+        font_style=font_style,
+        bold=bold,
+        width=profile.dot_width,
+        font_size=font_size,
+        align=align,
+        static_lines=static_lines,
+    )
+    try:
+        first = next(bands)
+    except Exception as e:
+        logger.error("Text rendering failed: %s", e)
+        for piece in _batch_lines(itertools.chain(head, remaining)):
+            yield piece.encode('utf-8') + b"\n"
+        return
+    head = None
+    yield from _encode_bands(itertools.chain([first], bands), metrics, profile)
+    yield b"\n"
+
+
+def _iter_text(
+    lines: Iterable[str],
+    font_style: str,
+    font_size: int,
+    align: str,
+    bold: bool,
+    metrics: dict,
+    profile: PrinterProfile,
+    render_mode: str = 'raster',
+    static_lines: AbstractSet[str] = frozenset(),
+) -> Iterator[bytes]:
+    """Yield ESC/POS bytes for body text lines as they arrive.
+
+    Lines are consumed lazily, so a streamed template starts printing
+    before it has finished rendering. Runs of lines that fit an eligible
+    font size are printed as user-defined characters instead of raster.
+    In 'hybrid' mode lines a template marked with the `raster` filter,
+    and lines the profile's code page cannot encode, use the custom font;
+    all other lines go out as native text under the alignment and
+    emphasis already selected. `static_lines` (a template's fixed text)
+    are rasterized from cached fragments.
+    """
+    if font_style not in ('montserrat', 'kings'):
+        # Default: plain UTF-8 text
+        for piece in _batch_lines(_unmark(lines)):
+            yield piece.encode('utf-8') + b"\n"
+        return
+
+    hybrid = render_mode == 'hybrid'
+    udc_font = udc.font_eligible(font_style, font_size)
+    if not udc_font and not hybrid:
+        yield from _iter_raster_text(
+            _unmark(lines), font_style, font_size, align, bold, metrics, profile, static_lines)
+        return
+
+    def _kind(line: str) -> str:
+        marked = line.startswith(RASTER_MARK)
+        if hybrid and not marked and _encodable(line, profile.code_page):
+            return 'native'
+        if udc_font and udc.is_eligible(line[1:] if marked else line, font_style, font_size):
+            return 'udc'
+        return 'raster'
+
+    defined: Set[str] = set()  # user-defined characters already downloaded
+    code_page_selected = False
+    for kind, group in itertools.groupby(lines, key=_kind):
+        group = _unmark(group)
+        if kind == 'raster':
+            yield from _iter_raster_text(
+                group, font_style, font_size, align, bold, metrics, profile, static_lines)
+            continue
+        for piece in _batch_lines(group):
+            encoded = None
+            if kind == 'udc':
+                encoded = udc.encode_text(piece, font_style, bold, font_size, defined)
+            if encoded is not None:
+                yield encoded
+            elif kind == 'native':
+                if not code_page_selected:
+                    yield profile.code_page_command()
+                    code_page_selected = True
+                yield piece.encode(profile.code_page) + b"\n"
+            else:
+                yield from _iter_raster_text(
+                    piece.split('\n'), font_style, font_size, align, bold, metrics, profile,
+                    static_lines)
+
+
+def _qr_native(qr_data: str, size: int, ec: str) -> bytes:
+    """GS ( k commands: select model 2, set module size and EC level, store, print."""
+    data = qr_data.encode('utf-8')
+    return (
+        GS_QR + b"\x04\x00" + b"1A2\x00"
+        + GS_QR + b"\x03\x00" + b"1C" + bytes((size,))
+        + GS_QR + b"\x03\x00" + b"1E" + QR_EC_LEVELS[ec]
+        + GS_QR + (len(data) + 3).to_bytes(2, 'little') + b"1P0" + data
+        + GS_QR + b"\x03\x00" + b"1Q0"
+    )
+
+
+def _encode_code(img: Image.Image, profile: PrinterProfile) -> bytes:
+    """A rendered QR code or barcode as GS v 0 blocks sized to the receive buffer."""
+    packed = pack_bitmap(img)
+    return encode_packed(packed, profile.raster_rows(packed.shape[1]))
+
+
+@functools.lru_cache(maxsize=config.CODE_CACHE_SIZE)
+def _qr_raster(qr_data: str, size: int, ec: str, profile: PrinterProfile) -> bytes:
+    """Render a QR code on the Pi as raster, for printers without GS ( k."""
+    qr = qrcode.QRCode(
+        version=None,
+        box_size=size,
+        border=1,
+        error_correction=getattr(qrcode.constants, f"ERROR_CORRECT_{ec}"),
+    )
+    qr.add_data(qr_data)
+    qr.make(fit=True)
+    img = qr.make_image().get_image().convert('RGB')
+    return b"\n" + _encode_code(img, profile) + b"\n\n"
+
+
+def _build_qr(qr_data: str, profile: PrinterProfile) -> bytes:
+    """Build ESC/POS bytes for a QR code, natively when the printer can."""
+    if profile.native_qr:
+        body = _qr_native(qr_data, QR_SIZE, QR_EC)
+    else:
+        body = _qr_raster(qr_data, QR_SIZE, QR_EC, profile)
+    return ESC_CENTER + body + b"\n"
+
+
+def _barcode_data(data: str, bc_type: str) -> str:
+    """Barcode data as sent with GS k."""
+    if bc_type == 'CODE128' and not data.startswith('{'):
+        return '{B' + data  # select code set B
+    return data
+
+
+def check_barcode(data: str, bc_type: str) -> bool:
+    """True if the printer can encode `data` as a `bc_type` barcode.
+
+    Checks the symbology's character set and length, as python-escpos
+    does, on the data as GS k will send it (at most 255 bytes).
+    """
+    return bool(Dummy.check_barcode(bc_type, _barcode_data(data, bc_type)))
+
+
+def _barcode_native(data: str, bc_type: str) -> bytes:
+    """GS k (function B) with height, module width and HRI text below."""
+    encoded = _barcode_data(data, bc_type).encode('ascii')
+    return (
+        b"\x1Dh" + bytes((BARCODE_HEIGHT,))
+        + b"\x1Dw" + bytes((BARCODE_WIDTH,))
+        + b"\x1Df\x00"  # HRI font A
+        + b"\x1DH\x02"  # HRI below
+        + b"\x1Dk" + bytes((BARCODE_SYSTEMS[bc_type], len(encoded))) + encoded
+    )
+
+
+class _ImageCapture(Dummy):
+    """Dummy printer that keeps the image it is asked to print instead."""
+
+    image_source = None
+
+    def image(self, img_source, *args, **kwargs):
+        self.image_source = img_source
+
+
+@functools.lru_cache(maxsize=config.CODE_CACHE_SIZE)
+def _barcode_raster(data: str, bc_type: str, profile: PrinterProfile) -> bytes:
+    """Render a barcode on the Pi via python-escpos's software renderer."""
+    capture = _ImageCapture()
+    capture.barcode(data, bc_type, height=BARCODE_HEIGHT, width=BARCODE_WIDTH,
+                    align_ct=False, force_software=True)
+    return _encode_code(capture.image_source, profile)
+
+
+def _build_barcode(barcode: dict, profile: PrinterProfile) -> bytes:
+    """Build ESC/POS bytes for a barcode, natively when the printer can."""
+    if profile.native_barcode:
+        body = _barcode_native(barcode['data'], barcode['type'])
+    else:
+        body = _barcode_raster(barcode['data'], barcode['type'], profile)
+    return ESC_CENTER + body + b"\n"
+
 
-def _build_barcode(barcode: dict) -> bytes:
-    """Build ESC/POS bytes for a barcode using Dummy printer."""
-    dummy = Dummy()
-    dummy.set(align='center')
-    dummy.barcode(barcode['data'], barcode['type'], height=50, width=2)
-    return dummy.output + b"\n"
+def _iter_template_lines(stream: Iterable[str], metrics: dict) -> Iterator[str]:
+    """Lines of a rendered template; a failure part-way ends the text."""
+    try:
+        yield from _split_lines(stream)
+    except Exception as e:
+        logger.error("Template rendering failed: %s", e)
+        metrics['template_error'] = str(e)
 
 
-def build_escpos_commands(payload: dict) -> bytes:
+def build_escpos_commands(
+    payload: dict,
+    metrics: Optional[dict] = None,
+    profile: Optional[PrinterProfile] = None,
+) -> bytes:
     """Convert a validated print job payload into an ESC/POS byte sequence."""
+    return b"".join(iter_escpos_commands(payload, metrics, profile))
+
+
+def iter_escpos_commands(
+    payload: dict,
+    metrics: Optional[dict] = None,
+    profile: Optional[PrinterProfile] = None,
+) -> Iterator[bytes]:
+    """Yield the ESC/POS byte sequence for a payload in printable chunks.
+
+    Body text is consumed line by line and custom-font text is streamed
+    as raster bands; templates render lazily into that stream. The first
+    band reaches the printer before the last line has been rendered or
+    laid out, and memory stays flat however long the document is.
+    Raster savings and the print mode are recorded into `metrics` when
+    given. Encodings are chosen from `profile` (default:
+    config.PRINTER_PROFILE).
+    """
+    if metrics is None:
+        metrics = {}
+    if profile is None:
+        profile = get_profile()
     commands = ESC_INIT
 
+    # Print speed/density for this job, restored to defaults before the cut
+    print_mode = payload.get('print_mode', 'normal')
+    metrics['print_mode'] = print_mode
+    enter_mode, restore_mode = _print_mode_commands(print_mode, profile)
+    commands += enter_mode
+
     font_style = payload.get('font_style', 'default')
     align = payload.get('align', 'left')
     font_size = payload.get('font_size', 24)
     bold = payload.get('bold', False)
+    render_mode = payload.get('render_mode')
+    static_lines: AbstractSet[str] = frozenset()
+    lines: Optional[Iterator[str]] = None
+    if payload.get('text'):
+        lines = iter(payload['text'].split('\n'))
 
-    # Template rendering: if a template is specified, render it to text
+    # Template rendering: if a template is specified, stream its output
+    # (Template.generate) line by line into the encoder. A template may
+    # choose its render mode with {% set render_mode = ... %} before its
+    # first line. Its static lines are drawn from pre-rasterized fragments.
     if payload.get('template'):
         try:
-            env = _get_jinja_env()
-            template = env.get_template(payload['template'] + '.j2')
-            rendered = template.render(**(payload.get('template_data') or {}))
-            payload = dict(payload)  # copy to avoid mutating original
-            payload['text'] = rendered
+            stream = get_template_store().render_stream(
+                payload['template'], payload.get('template_data') or {})
+            template_lines = _iter_template_lines(stream, metrics)
+            first = next(template_lines, None)
+            if first is not None:
+                lines = itertools.chain([first], template_lines)
+                render_mode = render_mode or stream.vars.get('render_mode')
+                static_lines = stream.static_lines
         except Exception as e:
             logger.error("Template rendering failed: %s", e)
+            metrics['template_error'] = str(e)
+
+    # Logo from NV memory
+    if payload.get('logo'):
+        commands += _build_logo(payload['logo'])
 
     # Header
     if payload.get('header'):
-        commands += _build_header(payload['header'], font_style, font_size)
+        commands += _build_header(payload['header'], font_style, font_size, metrics, profile)
 
     # Image
     if payload.get('image'):
-        commands += _build_image(payload['image'])
+        commands += _build_image(
+            payload['image'], metrics, profile, payload.get('dither'))
 
     # Alignment
     commands += ALIGN_MAP.get(align, ESC_LEFT)
@@ -163,24 +555,34 @@ def build_escpos_commands(payload: dict) -> bytes:
         commands += ESC_BOLD_ON
 
     # Main text
-    if payload.get('text'):
-        commands += _build_text(payload['text'], font_style, font_size, align, bold)
+    if lines is not None:
+        yield commands
+        commands = b""
+        yield from _iter_text(
+            lines, font_style, font_size, align, bold, metrics, profile,
+            render_mode or 'raster', static_lines,
+        )
 
     # Reset bold
     if bold:
         commands += ESC_BOLD_OFF
 
+    # Structured layout: native text sized to the profile's columns
+    if payload.get('lines'):
+        commands += compile_lines(payload['lines'], profile, payload.get('lines_font', 'A'))
+
     # QR code
     if payload.get('qr_code'):
-        commands += _build_qr(payload['qr_code'])
+        commands += _build_qr(payload['qr_code'], profile)
 
     # Barcode
     if payload.get('barcode'):
-        commands += _build_barcode(payload['barcode'])
+        commands += _build_barcode(payload['barcode'], profile)
 
     # Feed and cut
     commands += b"\n\n\n"
+    commands += restore_mode
     if payload.get('cut', True):
         commands += GS_CUT
 
-    return commands
+    yield commands
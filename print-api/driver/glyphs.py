@@ -0,0 +1,160 @@
+"""Glyph atlas: rasterize each glyph once, then build lines by blitting.
+
+Glyphs are stored as packed 1-bit rows (MSB first, 1 = black dot, the
+same layout as a raster page) together with their placement offset and
+advance width; a glyph is only unpacked while a line is built. The atlas
+is an LRU bounded by a byte budget sized to hold the common receipt
+glyph set for every font size the API accepts.
+"""
+import logging
+from collections import OrderedDict
+from typing import Hashable, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+logger = logging.getLogger(__name__)
+
+# Coverage at or above this level becomes a printed dot
+COVERAGE_THRESHOLD = 128
+
+# Approximate per-entry bookkeeping cost on top of the bitmap itself
+_ENTRY_OVERHEAD = 64
+
+
+class Glyph:
+    __slots__ = ('rows', 'width', 'left', 'top', 'advance')
+
+    def __init__(self, rows: np.ndarray, width: int, left: int, top: int, advance: float):
+        self.rows = rows
+        self.width = width
+        self.left = left
+        self.top = top
+        self.advance = advance
+
+    @property
+    def height(self) -> int:
+        return len(self.rows)
+
+    @property
+    def bitmap(self) -> np.ndarray:
+        """The glyph unpacked to a boolean array (True = black dot)."""
+        return np.unpackbits(self.rows, axis=1, count=self.width).astype(bool)
+
+    @property
+    def nbytes(self) -> int:
+        return self.rows.nbytes + _ENTRY_OVERHEAD
+
+
+def rasterize_glyph(font: ImageFont.FreeTypeFont, char: str) -> Glyph:
+    """Render a single character to thresholded, packed rows."""
+    left, top, right, bottom = font.getbbox(char)
+    advance = font.getlength(char)
+    if right <= left or bottom <= top:
+        return Glyph(np.zeros((0, 0), dtype=np.uint8), 0, 0, 0, advance)
+
+    mask = Image.new('L', (right - left, bottom - top), 0)
+    ImageDraw.Draw(mask).text((-left, -top), char, font=font, fill=255)
+    bitmap = np.asarray(mask) >= COVERAGE_THRESHOLD
+    return Glyph(np.packbits(bitmap, axis=1), right - left, left, top, advance)
+
+
+class GlyphAtlas:
+    """LRU cache of rasterized glyphs keyed by (font key, character)."""
+
+    def __init__(self, max_bytes: int):
+        self._max_bytes = max_bytes
+        self._glyphs: 'OrderedDict[Tuple[Hashable, str], Glyph]' = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, font_key: Hashable, font: ImageFont.FreeTypeFont, char: str) -> Glyph:
+        key = (font_key, char)
+        glyph = self._glyphs.get(key)
+        if glyph is not None:
+            self._glyphs.move_to_end(key)
+            self.hits += 1
+            return glyph
+
+        self.misses += 1
+        glyph = rasterize_glyph(font, char)
+        self._glyphs[key] = glyph
+        self._bytes += glyph.nbytes
+        while self._bytes > self._max_bytes and len(self._glyphs) > 1:
+            _, evicted = self._glyphs.popitem(last=False)
+            self._bytes -= evicted.nbytes
+        return glyph
+
+    def line_extent(
+        self, font_key: Hashable, font: ImageFont.FreeTypeFont, text: str,
+    ) -> Tuple[int, int]:
+        """Vertical (top, bottom) ink extent of a line relative to its origin."""
+        top, bottom = 0, 0
+        for ch in text:
+            glyph = self.get(font_key, font, ch)
+            if glyph.width:
+                top = min(top, glyph.top)
+                bottom = max(bottom, glyph.top + glyph.height)
+        return top, bottom
+
+    def blit_line(
+        self,
+        buf: np.ndarray,
+        font_key: Hashable,
+        font: ImageFont.FreeTypeFont,
+        text: str,
+        x: float,
+        y: int,
+    ) -> None:
+        """OR the glyphs of `text` into `buf` (one uint8 0/1 per dot),
+        clipping at its edges.
+
+        (x, y) is the left/ascender origin, matching ImageDraw.text's
+        default anchor.
+        """
+        height, width = buf.shape
+        for ch in text:
+            glyph = self.get(font_key, font, ch)
+            if glyph.width:
+                gx = int(round(x)) + glyph.left
+                gy = y + glyph.top
+                x0, y0 = max(gx, 0), max(gy, 0)
+                x1, y1 = min(gx + glyph.width, width), min(gy + glyph.height, height)
+                if x0 < x1 and y0 < y1:
+                    dots = np.unpackbits(glyph.rows[y0 - gy:y1 - gy], axis=1, count=x1 - gx)
+                    buf[y0:y1, x0:x1] |= dots[:, x0 - gx:]
+            x += glyph.advance
+
+    def line_strip(
+        self,
+        width: int,
+        font_key: Hashable,
+        font: ImageFont.FreeTypeFont,
+        text: str,
+        x: float,
+    ) -> Tuple[int, np.ndarray]:
+        """Rasterize one line into packed rows covering its ink extent.
+
+        Returns (top, rows): rows[0] sits `top` rows below the line origin.
+        Only the glyphs of a single line are ever held unpacked, so pages
+        built from strips cost one bit per dot.
+        """
+        top, bottom = self.line_extent(font_key, font, text)
+        line = np.zeros((bottom - top, width), dtype=np.uint8)
+        self.blit_line(line, font_key, font, text, x, -top)
+        return top, np.packbits(line, axis=1)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._glyphs)
+
+
+def or_rows(page: np.ndarray, rows: np.ndarray, y: int) -> None:
+    """OR packed `rows` into `page` starting at page row y, clipping at its edges."""
+    y0, y1 = max(y, 0), min(y + len(rows), page.shape[0])
+    if y0 < y1:
+        page[y0:y1] |= rows[y0 - y:y1 - y]
@@ -0,0 +1,171 @@
+"""Structured receipt layout compiled to native ESC/POS text.
+
+A `lines` payload describes a receipt as elements instead of
+pre-formatted text:
+
+- text: a paragraph, wrapped to the line width and aligned with ESC a.
+- row: columns with an optional character width and alignment; columns
+  without a width share what is left. Cells wrap onto extra lines or are
+  truncated (overflow: 'truncate').
+- separator: a rule of one repeated character across the full width.
+- total: a label on the left and its value on the right, bold by default.
+- feed: blank lines.
+
+Everything prints in the built-in font (A or B), so the column count
+comes from the active profile's dot width and the same payload lays out
+correctly on 58mm and 80mm paper. Text is encoded in the profile's code
+page, selected explicitly first. Size and emphasis map to one ESC ! per
+line; nothing is rasterized and no template is rendered.
+"""
+import logging
+import textwrap
+from typing import Any, Dict, List, Optional
+
+from .profiles import PrinterProfile
+
+logger = logging.getLogger(__name__)
+
+ESC = b"\x1B"
+
+LINE_TYPES = ('text', 'row', 'separator', 'total', 'feed')
+LINE_SIZES = ('normal', 'tall', 'wide', 'double')
+LINE_FONTS = ('A', 'B')
+OVERFLOW_MODES = ('wrap', 'truncate')
+
+# ESC ! n print mode bits
+_MODE_FONT_B = 0x01
+_MODE_BOLD = 0x08
+_MODE_TALL = 0x10
+_MODE_WIDE = 0x20
+_MODE_UNDERLINE = 0x80
+
+_SIZE_MODES = {
+    'normal': 0,
+    'tall': _MODE_TALL,
+    'wide': _MODE_WIDE,
+    'double': _MODE_TALL | _MODE_WIDE,
+}
+
+_ALIGN_CODES = {'left': b"\x00", 'center': b"\x01", 'right': b"\x02"}
+
+# Spaces between adjacent columns of a row
+COLUMN_GAP = 1
+
+
+def _print_mode(font: str, element: Dict[str, Any]) -> bytes:
+    mode = _SIZE_MODES[element.get('size', 'normal')]
+    if font == 'B':
+        mode |= _MODE_FONT_B
+    if element.get('bold'):
+        mode |= _MODE_BOLD
+    if element.get('underline'):
+        mode |= _MODE_UNDERLINE
+    return ESC + b"!" + bytes((mode,))
+
+
+def _line_columns(columns: int, element: Dict[str, Any]) -> int:
+    """Characters per line for an element, halved by double width."""
+    if element.get('size') in ('wide', 'double'):
+        return max(1, columns // 2)
+    return columns
+
+
+def _encode(text: str, code_page: str) -> bytes:
+    return text.encode(code_page, errors='replace')
+
+
+def _pad(text: str, width: int, align: str) -> str:
+    if align == 'right':
+        return text.rjust(width)
+    if align == 'center':
+        return text.center(width)
+    return text.ljust(width)
+
+
+def _wrap(text: str, width: int) -> List[str]:
+    return textwrap.wrap(text, width) or ['']
+
+
+def column_widths(widths: List[Optional[int]], total: int) -> List[int]:
+    """Resolve requested column widths (None = flexible) to fit `total` characters.
+
+    Flexible columns split the space the fixed ones leave, earlier columns
+    taking any remainder. If the fixed widths alone do not fit, every
+    column shrinks proportionally; each keeps at least one character.
+    """
+    available = max(total - COLUMN_GAP * (len(widths) - 1), len(widths))
+    fixed = sum(w for w in widths if w is not None)
+    flexible = [i for i, w in enumerate(widths) if w is None]
+    if fixed + len(flexible) > available:
+        requested = [w if w is not None else 1 for w in widths]
+        scale = available / sum(requested)
+        resolved = [max(1, int(w * scale)) for w in requested]
+        resolved[-1] = max(1, available - sum(resolved[:-1]))
+        return resolved
+
+    resolved = list(widths)
+    share, extra = divmod(available - fixed, len(flexible)) if flexible else (0, 0)
+    for n, i in enumerate(flexible):
+        resolved[i] = share + (1 if n < extra else 0)
+    return resolved
+
+
+def _compile_row(columns: int, cells: List[Dict[str, Any]]) -> List[str]:
+    widths = column_widths([cell.get('width') for cell in cells], columns)
+    wrapped = []
+    for cell, width in zip(cells, widths):
+        text = cell.get('text', '')
+        if cell.get('overflow') == 'truncate':
+            wrapped.append([text[:width]])
+        else:
+            wrapped.append(_wrap(text, width))
+
+    gap = ' ' * COLUMN_GAP
+    lines = []
+    for n in range(max(len(parts) for parts in wrapped)):
+        line = gap.join(
+            _pad(parts[n] if n < len(parts) else '', width, cell.get('align', 'left'))
+            for cell, parts, width in zip(cells, wrapped, widths)
+        )
+        lines.append(line.rstrip())
+    return lines
+
+
+def _compile_element(element: Dict[str, Any], columns: int, font: str, code_page: str) -> bytes:
+    kind = element['type']
+    if kind == 'feed':
+        return b"\n" * element.get('lines', 1)
+
+    columns = _line_columns(columns, element)
+    align = b"\x00"
+    if kind == 'text':
+        align = _ALIGN_CODES[element.get('align', 'left')]
+        lines = []
+        for paragraph in element.get('text', '').split('\n'):
+            lines.extend(_wrap(paragraph, columns))
+    elif kind == 'separator':
+        lines = [element.get('char', '-') * columns]
+    elif kind == 'total':
+        value = element.get('value', '')
+        lines = _compile_row(columns, [
+            {'text': element.get('label', '')},
+            {'text': value, 'width': min(len(value), columns // 2) or None, 'align': 'right'},
+        ])
+        element = dict(element, bold=element.get('bold', True))
+    else:
+        lines = _compile_row(columns, element['columns'])
+
+    body = b"".join(_encode(line, code_page) + b"\n" for line in lines)
+    return ESC + b"a" + align + _print_mode(font, element) + body
+
+
+def compile_lines(lines: List[Dict[str, Any]], profile: PrinterProfile, font: str = 'A') -> bytes:
+    """Compile validated layout elements to ESC/POS for `profile`'s paper width.
+
+    Leaves the printer in left-aligned, normal-size font A, with the
+    profile's code page selected.
+    """
+    columns = profile.columns(font)
+    body = b"".join(
+        _compile_element(element, columns, font, profile.code_page) for element in lines)
+    return profile.code_page_command() + body + ESC + b"a\x00" + ESC + b"!\x00"
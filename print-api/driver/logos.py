@@ -0,0 +1,230 @@
+"""NV graphics logo registry: define a bitmap once, print it by key.
+
+Logos are stored in the printer's non-volatile graphics memory with
+GS ( L function 67 and printed with function 69, so a receipt logo costs a
+few bytes instead of its full raster. The registry remembers what has
+been stored (by content hash) in a JSON manifest and uploads pending
+definitions before the next job. Whenever the printer is opened, its own
+key list (GS ( L function 64) is read back and only the logos it lacks,
+e.g. after the device was swapped, are defined again.
+
+NV memory has a limited number of write cycles, so a re-registered logo
+whose content hash is unchanged is never rewritten.
+"""
+import os
+import json
+import base64
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .raster import GS, pack_bitmap
+
+logger = logging.getLogger(__name__)
+
+# Printer key codes are two characters in 0x20-0x7E
+KEY_LENGTH = 2
+
+# Reply header for GS ( L fn 64, and its status bytes: last block / more follow
+_KEY_LIST_HEADER = b"\x37\x70"
+_KEY_LIST_LAST = 0x40
+_KEY_LIST_MORE = 0x41
+
+# Logo work covered by one pending_commands() call: (key, hash), hash None for a delete
+SyncBatch = List[Tuple[str, Optional[str]]]
+
+
+def is_valid_key(key: str) -> bool:
+    return len(key) == KEY_LENGTH and all(0x20 <= ord(ch) <= 0x7E for ch in key)
+
+
+def _graphics_command(params: bytes) -> bytes:
+    """Wrap function parameters in GS ( L, or GS 8 L when too long."""
+    if len(params) <= 0xFFFF:
+        return GS + b"(L" + len(params).to_bytes(2, 'little') + params
+    return GS + b"8L" + len(params).to_bytes(4, 'little') + params
+
+
+def define_command(key: str, packed: np.ndarray, width: int) -> bytes:
+    """GS ( L fn 67: define NV graphics data (raster, monochrome)."""
+    height = packed.shape[0]
+    params = (
+        b"0C0" + key.encode('ascii') + b"\x01"
+        + width.to_bytes(2, 'little') + height.to_bytes(2, 'little')
+        + b"1" + packed.tobytes()
+    )
+    return _graphics_command(params)
+
+
+def delete_command(key: str) -> bytes:
+    """GS ( L fn 66: delete the NV graphics data stored under key."""
+    return _graphics_command(b"0B" + key.encode('ascii'))
+
+
+def print_command(key: str) -> bytes:
+    """GS ( L fn 69: print NV graphics data at normal scale."""
+    return _graphics_command(b"0E" + key.encode('ascii') + b"\x01\x01")
+
+
+# GS ( L fn 64: transmit the key code list of defined NV graphics
+KEY_LIST_QUERY = _graphics_command(b"0@KC")
+
+
+def parse_key_list(reply: bytes) -> Optional[Tuple[Set[str], bool]]:
+    """Key codes from one GS ( L fn 64 reply block, and whether more follow.
+
+    None if the reply is missing or malformed.
+    """
+    start = reply.find(_KEY_LIST_HEADER)
+    end = reply.find(b"\0", start)
+    if start < 0 or end < 0 or end < start + 3:
+        return None
+    status = reply[start + 2]
+    data = reply[start + 3:end]
+    if status not in (_KEY_LIST_LAST, _KEY_LIST_MORE) or len(data) % KEY_LENGTH:
+        return None
+    keys = {data[i:i + KEY_LENGTH].decode('ascii', 'replace')
+            for i in range(0, len(data), KEY_LENGTH)}
+    return keys, status == _KEY_LIST_MORE
+
+
+class LogoRegistry:
+    """Tracks logos stored in printer NV memory. Thread-safe."""
+
+    def __init__(self, manifest_path: str, capacity: int):
+        self._path = manifest_path
+        self._capacity = capacity
+        self._lock = threading.Lock()
+        self._logos: Dict[str, dict] = {}
+        self._pending_deletes: List[str] = []
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self._path):
+            return
+        try:
+            with open(self._path) as f:
+                self._logos = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error("Could not read logo manifest %s: %s", self._path, e)
+
+    def _save(self):
+        tmp = self._path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self._logos, f)
+        os.replace(tmp, self._path)
+
+    def register(self, key: str, img: Image.Image) -> dict:
+        """Store a logo under key; it is uploaded before the next job."""
+        packed = pack_bitmap(img)
+        data = packed.tobytes()
+        digest = hashlib.sha256(
+            img.width.to_bytes(2, 'little') + data).hexdigest()
+        with self._lock:
+            entry = self._logos.get(key)
+            if entry and entry['hash'] == digest:
+                return self._describe(key, entry)
+            entry = {
+                'hash': digest,
+                'width': img.width,
+                'height': img.height,
+                'data': base64.b64encode(data).decode('ascii'),
+                'synced': False,
+            }
+            self._logos[key] = entry
+            self._save()
+            logger.info("Logo %r registered (%dx%d, %d bytes)",
+                        key, img.width, img.height, len(data))
+            return self._describe(key, entry)
+
+    def remove(self, key: str) -> bool:
+        with self._lock:
+            if self._logos.pop(key, None) is None:
+                return False
+            self._pending_deletes.append(key)
+            self._save()
+            return True
+
+    def has(self, key: str) -> bool:
+        with self._lock:
+            return key in self._logos
+
+    def mark_missing(self, stored: Set[str]):
+        """Queue every logo whose key is not in the printer's key list `stored`."""
+        with self._lock:
+            for key, entry in self._logos.items():
+                if entry['synced'] and key not in stored:
+                    logger.info("Logo %r missing from printer NV memory, re-sending", key)
+                    entry['synced'] = False
+
+    def pending_commands(self) -> Tuple[bytes, SyncBatch]:
+        """NV define/delete commands for everything not yet on the printer,
+        and the batch to pass to mark_synced() once they are written."""
+        with self._lock:
+            out = [delete_command(key) for key in self._pending_deletes]
+            batch: SyncBatch = [(key, None) for key in self._pending_deletes]
+            for key, entry in self._logos.items():
+                if not entry['synced']:
+                    packed = np.frombuffer(base64.b64decode(entry['data']), dtype=np.uint8)
+                    packed = packed.reshape(entry['height'], -1)
+                    out.append(define_command(key, packed, entry['width']))
+                    batch.append((key, entry['hash']))
+            return b"".join(out), batch
+
+    def mark_synced(self, batch: SyncBatch):
+        """Record that the commands for `batch` were written.
+
+        Logos registered or removed meanwhile stay pending: a define only
+        counts if the key still holds the hash that was sent.
+        """
+        with self._lock:
+            changed = False
+            for key, digest in batch:
+                if digest is None:
+                    if key in self._pending_deletes:
+                        self._pending_deletes.remove(key)
+                    continue
+                entry = self._logos.get(key)
+                if entry is not None and entry['hash'] == digest and not entry['synced']:
+                    entry['synced'] = True
+                    changed = True
+            if changed:
+                self._save()
+
+    @staticmethod
+    def _nbytes(width: int, height: int) -> int:
+        return ((width + 7) // 8) * height
+
+    def _describe(self, key: str, entry: dict) -> dict:
+        return {
+            'key': key,
+            'hash': entry['hash'],
+            'width': entry['width'],
+            'height': entry['height'],
+            'bytes': self._nbytes(entry['width'], entry['height']),
+            'synced': entry['synced'],
+        }
+
+    def status(self) -> dict:
+        with self._lock:
+            logos = [self._describe(k, e) for k, e in self._logos.items()]
+        used = sum(logo['bytes'] for logo in logos)
+        return {
+            'logos': logos,
+            'nv_bytes_used': used,
+            'nv_capacity': self._capacity,
+        }
+
+    def fits(self, img: Image.Image, replacing: Optional[str] = None) -> bool:
+        """True if a logo of this size fits in the remaining NV capacity."""
+        size = self._nbytes(img.width, img.height)
+        with self._lock:
+            used = sum(
+                self._nbytes(e['width'], e['height'])
+                for k, e in self._logos.items() if k != replacing
+            )
+        return used + size <= self._capacity
@@ -6,22 +6,43 @@ Supports three backends:
   - 'dummy'    : escpos.printer.Dummy (development/testing)
 """
 import os
+import time
+import select
 import logging
+from concurrent.futures import Future
+from typing import Iterable, Iterator, Optional, Set, Union
+
+from escpos.exceptions import Error as EscposError
 
 import config
-from .escpos_builder import build_escpos_commands
+from .escpos_builder import iter_escpos_commands
+from .logos import KEY_LIST_QUERY, parse_key_list
+from .profiles import MODEL_QUERY, detect_profile, get_profile, parse_model_reply
 
 logger = logging.getLogger(__name__)
 
 # ESC/POS init command for resetting printer state after reconnect
 ESC_INIT = b"\x1B\x40"
 
+# How long to wait for the printer to answer a status query
+QUERY_TIMEOUT = 0.5
+
+# Asks the printer for the next block of a multi-block reply
+ACK = b"\x06"
+
+# Give up on an NV key list longer than this many reply blocks
+MAX_KEY_LIST_BLOCKS = 32
+
 
 class PrinterDriver:
-    def __init__(self, device: str, backend: str = None):
+    def __init__(self, device: str, backend: str = None, logos=None, profile=None, render_pool=None):
         self._device = device
         self._backend = backend or config.PRINTER_BACKEND
+        self._profile = profile or get_profile()
+        self._detect_profile = profile is None and config.PRINTER_PROFILE == 'auto'
         self._printer = None
+        self._logos = logos
+        self._render_pool = render_pool
 
     def _open(self):
         """Open or reopen the printer handle."""
@@ -32,9 +53,21 @@ class PrinterDriver:
                 pass
             self._printer = None
 
+        # Queries run before our handle exists: usblp allows one open at a time
+        if self._detect_profile:
+            self._identify()
+        if self._logos is not None:
+            self._check_logos()
+
         if self._backend == 'file':
             from escpos.printer import File
-            self._printer = File(self._device)
+            printer = File(self._device)
+            try:
+                # File opens lazily on first write; fail here instead
+                printer.open()
+            except EscposError as e:
+                raise IOError(f"Cannot open printer device {self._device}: {e}") from e
+            self._printer = printer
         elif self._backend == 'win32raw':
             from escpos.printer import Win32Raw
             self._printer = Win32Raw(self._device)
@@ -46,6 +79,88 @@ class PrinterDriver:
 
         logger.info("Printer opened: %s (backend=%s)", self._device, self._backend)
 
+    def connect(self):
+        """Open the printer now, so its profile is known before jobs are rendered.
+
+        A printer that is not there yet is opened by the first job instead.
+        """
+        try:
+            self._open()
+        except (IOError, OSError) as e:
+            logger.warning("Printer not available at startup: %s", e)
+
+    @property
+    def profile(self):
+        return self._profile
+
+    def _identify(self):
+        """Pick the capability profile from the model name reported by GS I."""
+        model = parse_model_reply(self._query(MODEL_QUERY))
+        profile = detect_profile(model) if model else None
+        if profile is None:
+            logger.info("Printer model %r not recognized, keeping profile %s",
+                        model, self._profile.name)
+            return
+        self._profile = profile
+        logger.info("Printer model %s, using profile %s", model, profile.name)
+
+    def _check_logos(self):
+        """Re-send NV logos the printer does not hold (it may be a different one).
+
+        Printers that cannot report their key list keep the recorded state.
+        """
+        keys = self._read_logo_keys()
+        if keys is not None:
+            self._logos.mark_missing(keys)
+
+    def _read_logo_keys(self) -> Optional[Set[str]]:
+        """Key codes of the NV graphics stored in the printer, or None if unknown."""
+        keys: Set[str] = set()
+        reply = self._query(KEY_LIST_QUERY)
+        for _ in range(MAX_KEY_LIST_BLOCKS):
+            parsed = parse_key_list(reply)
+            if parsed is None:
+                return None
+            block, more = parsed
+            keys |= block
+            if not more:
+                return keys
+            reply = self._query(ACK)
+        return None
+
+    def _query(self, command: bytes, timeout: float = QUERY_TIMEOUT) -> bytes:
+        """Send a status command and read the reply, up to a NUL or timeout.
+
+        Only the Linux 'file' backend can read back from the printer
+        (usblp devices are bidirectional); other backends return b"".
+        Must run while the escpos handle is closed: the query uses its own
+        read/write handle and usblp refuses a second open.
+        """
+        if self._backend != 'file':
+            return b""
+        try:
+            fd = os.open(self._device, os.O_RDWR | os.O_NONBLOCK)
+        except OSError as e:
+            logger.debug("Cannot open %s for a query: %s", self._device, e)
+            return b""
+        reply = b""
+        try:
+            os.write(fd, command)
+            deadline = time.monotonic() + timeout
+            while b"\0" not in reply:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                    break
+                chunk = os.read(fd, 64)
+                if not chunk:
+                    break
+                reply += chunk
+        except OSError as e:
+            logger.debug("Printer query failed: %s", e)
+        finally:
+            os.close(fd)
+        return reply
+
     def _ensure_connected(self):
         """Verify connection, reopen if needed."""
         if self._printer is None:
@@ -73,30 +188,65 @@ class PrinterDriver:
                 return False
         return False
 
-    def print_job(self, job):
+    def render_job(self, job) -> Union[Iterator[bytes], Future]:
+        """ESC/POS chunks for a job, built lazily. Safe to run off the consumer thread.
+
+        With a render pool, returns a Future of the whole job's bytes instead.
+        """
+        if job.is_raw:
+            return iter((job.payload.get('raw_data', b''),))
+        if self._render_pool is not None:
+            return self._render_pool.submit(job.payload, self._profile, job.metrics)
+        return iter_escpos_commands(job.payload, job.metrics, self._profile)
+
+    def print_job(self, job, chunks: Optional[Iterable[bytes]] = None):
         """Execute a print job. Called from the queue consumer thread only.
 
         Args:
             job: PrintJob instance with payload dict and is_raw flag.
+            chunks: the job's output from render_job() when the queue
+                renders ahead; built here otherwise.
         """
         self._ensure_connected()
+        self._sync_logos()
 
-        if job.is_raw:
-            raw_data = job.payload.get('raw_data', b'')
-            self._send_raw(raw_data)
-        else:
-            commands = build_escpos_commands(job.payload)
+        if chunks is None:
+            chunks = self.render_job(job)
+        if isinstance(chunks, Future):
+            chunks = (chunks.result(),)
+        self._send_stream(chunks)
+
+    def _sync_logos(self):
+        """Upload pending NV logo definitions before the job's own data."""
+        if self._logos is None:
+            return
+        commands, batch = self._logos.pending_commands()
+        if commands:
             self._send_raw(commands)
+            self._logos.mark_synced(batch)
+            logger.info("Synced NV logos (%d bytes)", len(commands))
 
     def _send_raw(self, data: bytes):
         """Send raw bytes to the printer with retry-once on I/O error."""
         try:
             self._write(data)
-        except (IOError, OSError) as e:
+        except (IOError, OSError, EscposError) as e:
             logger.warning("Print I/O error, reopening: %s", e)
             self._open()
             self._write(ESC_INIT + data)  # re-init printer state then retry
 
+    def _send_stream(self, chunks):
+        """Send chunks to the printer as they are produced.
+
+        Only the first chunk gets the reconnect-and-retry treatment; once
+        output has started, a retry would reprint part of the receipt, so
+        later I/O errors fail the job instead.
+        """
+        chunks = iter(chunks)
+        self._send_raw(next(chunks, b""))
+        for chunk in chunks:
+            self._write(chunk)
+
     def _write(self, data: bytes):
         """Write bytes to the printer handle."""
         if self._backend == 'dummy':
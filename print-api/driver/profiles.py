@@ -0,0 +1,122 @@
+"""Printer capability profiles.
+
+A profile records a printer model's paper width and which ESC/POS
+features it implements, so the builder can choose the cheapest encoding
+that model will print correctly and render rasters at exactly its dot
+width. Select one with PRINTER_PROFILE, or set PRINTER_PROFILE=auto to
+identify the printer with GS I when the driver connects.
+"""
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import config
+from .raster import DEFAULT_DPI, ESC, FRAGMENT_HEIGHT, GS, RASTER_SPEED_MM_S
+
+logger = logging.getLogger(__name__)
+
+FS = b"\x1C"
+
+# ESC t page numbers (Epson numbering) of the code pages native text may
+# be encoded in. cp858 is cp850 with the euro sign.
+CODE_PAGES = {'cp437': 0, 'cp850': 2, 'cp1252': 16, 'cp858': 19}
+
+# Character cell width in dots of the built-in fonts (12x24 and 9x17)
+FONT_DOT_WIDTHS = {'A': 12, 'B': 9}
+
+
+@dataclass(frozen=True)
+class PrinterProfile:
+    name: str
+    dot_width: int = 512  # printable dots per line
+    dpi: int = DEFAULT_DPI  # print head resolution, dots per inch
+    motion_units: int = DEFAULT_DPI  # ESC J vertical motion units per inch
+    native_qr: bool = True  # GS ( k QR code
+    native_barcode: bool = True  # GS k 1D barcodes
+    receive_buffer: int = 4096  # bytes; raster blocks are sized to fit
+    print_speed: float = RASTER_SPEED_MM_S  # mm/s for raster graphics
+    speed_levels: int = 0  # GS ( K print speed levels; 0 = not supported
+    density_control: bool = False  # GS ( K print density
+    code_page: str = 'cp437'  # built-in font character table (see CODE_PAGES)
+
+    def raster_rows(self, width_bytes: int) -> int:
+        """Rows per GS v 0 block so that one block fits the receive buffer.
+
+        A printer can print a buffered block while the next one arrives;
+        a block larger than the buffer stalls the head between bursts.
+        """
+        return max(1, min((self.receive_buffer - 8) // max(width_bytes, 1), FRAGMENT_HEIGHT))
+
+    def code_page_command(self) -> bytes:
+        """FS . (leave Kanji mode) and ESC t selecting `code_page`.
+
+        ESC @ restores the code page set by the memory switches, which is
+        not necessarily PC437, so native text always selects its own.
+        """
+        return FS + b"." + ESC + b"t" + bytes((CODE_PAGES[self.code_page],))
+
+    def columns(self, font: str = 'A') -> int:
+        """Characters per line in built-in font A or B (48/64 on 576 dots)."""
+        return self.dot_width // FONT_DOT_WIDTHS[font]
+
+
+PROFILES: Dict[str, PrinterProfile] = {
+    # 80mm paper, 64mm print area
+    'default': PrinterProfile('default'),
+    # Bare raster printers: QR and barcodes are rendered on the Pi
+    'raster-only': PrinterProfile('raster-only', native_qr=False, native_barcode=False),
+    # Printers with a large receive buffer: fewer, bigger raster blocks
+    'large-buffer': PrinterProfile('large-buffer', receive_buffer=64 * 1024),
+    # Generic 58mm printers, 48mm print area
+    '58mm': PrinterProfile('58mm', dot_width=384, print_speed=90.0),
+    # 80mm printers at 203 dpi with a 72mm print area
+    '80mm-576': PrinterProfile('80mm-576', dot_width=576),
+    'epson-tm-t20': PrinterProfile('epson-tm-t20', dot_width=576, print_speed=250.0,
+                                   speed_levels=9, density_control=True, code_page='cp858'),
+    # 180 dpi head, 72mm print area; ESC J feeds in 1/360 inch units
+    'epson-tm-t88': PrinterProfile('epson-tm-t88', dot_width=512, dpi=180, motion_units=360,
+                                   print_speed=300.0, speed_levels=13, density_control=True,
+                                   code_page='cp858'),
+    'epson-tm-m30': PrinterProfile('epson-tm-m30', dot_width=576, print_speed=200.0,
+                                   speed_levels=9, density_control=True, code_page='cp858'),
+}
+
+# GS I 67: transmit printer model name, answered as "_<name>\0"
+MODEL_QUERY = GS + b"I" + bytes((67,))
+
+# Model name prefixes reported by GS I and the profile they map to
+MODEL_PROFILES = {
+    'TM-T20': 'epson-tm-t20',
+    'TM-T88': 'epson-tm-t88',
+    'TM-m30': 'epson-tm-m30',
+}
+
+
+def parse_model_reply(reply: bytes) -> str:
+    """Extract the model name from a GS I 67 reply ("_" + name + NUL)."""
+    start = reply.find(b"_")
+    if start < 0:
+        return ''
+    end = reply.find(b"\0", start)
+    name = reply[start + 1:end if end >= 0 else len(reply)]
+    return name.decode('ascii', errors='replace').strip()
+
+
+def detect_profile(model: str) -> Optional[PrinterProfile]:
+    """Profile for a model name reported by the printer, if it is known."""
+    for prefix, name in MODEL_PROFILES.items():
+        if model.startswith(prefix):
+            return PROFILES[name]
+    return None
+
+
+def get_profile(name: Optional[str] = None) -> PrinterProfile:
+    """Look up a profile by name, defaulting to config.PRINTER_PROFILE."""
+    name = name or config.PRINTER_PROFILE
+    profile = PROFILES.get(name)
+    if profile is None:
+        # 'auto' starts from the default until the printer identifies itself
+        if name != 'auto':
+            logger.warning("Unknown printer profile %r, using default", name)
+        profile = PROFILES['default']
+    return profile
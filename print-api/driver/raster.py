@@ -0,0 +1,257 @@
+"""NumPy raster encoder for ESC/POS bit images.
+
+Replaces the per-call escpos Dummy().image() conversion with vectorized
+thresholding and np.packbits. Byte output matches python-escpos defaults
+(high density, 960-row fragments) so printed results are unchanged.
+"""
+import logging
+from typing import Union
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+GS = b"\x1D"
+ESC = b"\x1B"
+
+# python-escpos splits images taller than this into separate commands
+FRAGMENT_HEIGHT = 960
+
+# Modes whose conversion to 'L' is identical to python-escpos's
+# RGBA-over-white composite, so the composite step can be skipped.
+_DIRECT_L_MODES = ('1', 'L', 'RGB')
+
+Bitmap = Union[Image.Image, np.ndarray]
+
+
+def _int_low_high(value: int, out_bytes: int) -> bytes:
+    return value.to_bytes(out_bytes, 'little')
+
+
+def to_gray(img: Image.Image) -> np.ndarray:
+    """Return an 8-bit grayscale array with transparency flattened onto white."""
+    if img.mode not in _DIRECT_L_MODES:
+        rgba = img.convert('RGBA')
+        flat = Image.new('RGB', rgba.size, (255, 255, 255))
+        flat.paste(rgba, mask=rgba.split()[3])
+        img = flat
+    return np.asarray(img.convert('L'))
+
+
+def _pack_gray(gray: np.ndarray) -> np.ndarray:
+    """Pack a grayscale array into 1-bit rows (1 = black dot).
+
+    Two-tone input is thresholded with NumPy; anything with intermediate
+    shades goes through Pillow's Floyd-Steinberg, exactly as python-escpos
+    does, so the output bytes stay identical.
+    """
+    dots = gray < 128
+    if np.array_equal(gray, np.where(dots, 0, 255).astype(np.uint8)):
+        return np.packbits(dots, axis=1)
+    dithered = Image.fromarray(255 - gray).convert('1')
+    packed = np.frombuffer(dithered.tobytes(), dtype=np.uint8)
+    return packed.reshape(gray.shape[0], -1)
+
+
+def pack_bitmap(source: Bitmap, fragment_height: int = FRAGMENT_HEIGHT) -> np.ndarray:
+    """Convert an image or array into packed raster rows.
+
+    Accepts a PIL image, a boolean array (True = black dot) or a uint8
+    grayscale array (0 = black). Returns a uint8 array of shape
+    (height, ceil(width / 8)), MSB first. Dithering runs per fragment to
+    match how python-escpos splits tall images.
+    """
+    if isinstance(source, np.ndarray) and source.dtype == np.bool_:
+        return np.packbits(source, axis=1)
+
+    if isinstance(source, Image.Image):
+        if source.mode == '1':
+            return np.packbits(~np.asarray(source), axis=1)
+        gray = to_gray(source)
+    else:
+        gray = np.asarray(source, dtype=np.uint8)
+
+    if gray.shape[0] <= fragment_height:
+        return _pack_gray(gray)
+    return np.concatenate([
+        _pack_gray(gray[top:top + fragment_height])
+        for top in range(0, gray.shape[0], fragment_height)
+    ])
+
+
+def _bitmap_width(source: Bitmap) -> int:
+    if isinstance(source, Image.Image):
+        return source.width
+    return source.shape[1]
+
+
+def encode_raster(source: Bitmap, fragment_height: int = FRAGMENT_HEIGHT) -> bytes:
+    """Encode an image as `GS v 0` raster bit image commands."""
+    packed = pack_bitmap(source, fragment_height)
+    return encode_packed(packed, fragment_height)
+
+
+def encode_packed(packed: np.ndarray, fragment_height: int = FRAGMENT_HEIGHT) -> bytes:
+    """Encode already-packed raster rows as `GS v 0` commands."""
+    height, width_bytes = packed.shape
+    out = []
+    for top in range(0, height, fragment_height):
+        block = packed[top:top + fragment_height]
+        out.append(
+            GS + b"v0\x00"
+            + _int_low_high(width_bytes, 2)
+            + _int_low_high(block.shape[0], 2)
+        )
+        out.append(block.tobytes())
+    return b"".join(out)
+
+
+def encode_column(
+    source: Bitmap,
+    high_density_vertical: bool = True,
+    fragment_height: int = FRAGMENT_HEIGHT,
+) -> bytes:
+    """Encode an image as `ESC *` column-format bit image commands."""
+    width = _bitmap_width(source)
+    dots = np.unpackbits(pack_bitmap(source, fragment_height), axis=1)[:, :width]
+    line_height = 24 if high_density_vertical else 8
+    density = 1 + (32 if high_density_vertical else 0)
+    header = ESC + b"*" + bytes((density,)) + _int_low_high(width, 2)
+
+    out = []
+    for top in range(0, dots.shape[0], fragment_height):
+        fragment = dots[top:top + fragment_height]
+        pad = -fragment.shape[0] % line_height
+        if pad:
+            fragment = np.pad(fragment, ((0, pad), (0, 0)))
+        out.append(ESC + b"3\x10")
+        for band in range(0, fragment.shape[0], line_height):
+            columns = np.packbits(fragment[band:band + line_height].T, axis=1)
+            out.append(header + columns.tobytes() + b"\n")
+        out.append(ESC + b"2")
+    return b"".join(out)
+
+
+# ESC J n feeds n vertical motion units, at most 255 per command. The
+# unit is 1/203 inch (one dot row) on the 203 dpi printers we default to;
+# profiles give the resolution and motion unit of other models.
+FEED_MAX_UNITS = 255
+DEFAULT_DPI = 203
+MM_PER_INCH = 25.4
+
+# Command overhead of splitting a raster: ESC J n plus a new GS v 0 header
+_SPLIT_COST = 3 + 8
+
+# Print-time model for savings reports: raster rows move at the printer's
+# graphics speed, ESC J feeds at full paper-feed speed.
+RASTER_SPEED_MM_S = 100.0
+FEED_SPEED_MM_S = 200.0
+
+
+def row_ms(speed_mm_s: float, dpi: int = DEFAULT_DPI) -> float:
+    """Milliseconds to move the paper one dot row at `speed_mm_s`."""
+    return 1000.0 * MM_PER_INCH / (speed_mm_s * dpi)
+
+
+def encode_feed(rows: int, dpi: int = DEFAULT_DPI, motion_units: int = DEFAULT_DPI) -> bytes:
+    """Encode a paper feed of `rows` dot rows as ESC J commands.
+
+    `motion_units` is the vertical motion unit per inch (GS P), so one
+    dot row at `dpi` is motion_units / dpi units.
+    """
+    units = round(rows * motion_units / dpi)
+    out = []
+    while units > 0:
+        step = min(units, FEED_MAX_UNITS)
+        out.append(ESC + b"J" + bytes((step,)))
+        units -= step
+    return b"".join(out)
+
+
+def _runs(mask: np.ndarray):
+    """Yield (start, end, value) for each run of equal values in a 1-D mask."""
+    edges = np.flatnonzero(mask[1:] != mask[:-1]) + 1
+    bounds = [0, *edges.tolist(), len(mask)]
+    for start, end in zip(bounds, bounds[1:]):
+        yield start, end, bool(mask[start])
+
+
+class BlankRowTrimmer:
+    """Drop and compress all-white rows in a stream of packed raster bands.
+
+    Leading and trailing blank rows are cropped; internal blank runs are
+    sent as ESC J paper feeds whenever that is cheaper than the raster
+    rows themselves. Ink is sent in GS v 0 blocks of at most `max_rows`
+    rows. Feeds and print time follow the printer's `dpi` and vertical
+    `motion_units`. Call finish() after the last band.
+    """
+
+    def __init__(
+        self,
+        max_rows: int = FRAGMENT_HEIGHT,
+        raster_speed: float = RASTER_SPEED_MM_S,
+        dpi: int = DEFAULT_DPI,
+        motion_units: int = DEFAULT_DPI,
+    ):
+        self._max_rows = max_rows
+        self._raster_speed = raster_speed
+        self._dpi = dpi
+        self._motion_units = motion_units
+        self._pending = 0
+        self._started = False
+        self.input_bytes = 0
+        self.output_bytes = 0
+        self.rows_cropped = 0
+        self.rows_fed = 0
+
+    def encode(self, band: np.ndarray) -> bytes:
+        """Encode one band, holding back any blank rows at its end."""
+        height, width_bytes = band.shape
+        if not height:
+            return b""
+        # Baseline: the same rows sent untrimmed in blocks of the same size
+        blocks = -(-height // self._max_rows)
+        self.input_bytes += blocks * 8 + band.size
+        min_gap = _SPLIT_COST // max(width_bytes, 1) + 1
+
+        out = []
+        for start, end, blank in _runs(~band.any(axis=1)):
+            if blank:
+                self._pending += end - start
+                continue
+            block = band[start:end]
+            if self._pending:
+                if not self._started:
+                    self.rows_cropped += self._pending
+                elif self._pending >= min_gap:
+                    out.append(encode_feed(self._pending, self._dpi, self._motion_units))
+                    self.rows_fed += self._pending
+                else:
+                    pad = np.zeros((self._pending, width_bytes), dtype=np.uint8)
+                    block = np.concatenate([pad, block])
+                self._pending = 0
+            out.append(encode_packed(block, self._max_rows))
+            self._started = True
+
+        data = b"".join(out)
+        self.output_bytes += len(data)
+        return data
+
+    def finish(self) -> None:
+        """Crop whatever blank rows are still pending at the end."""
+        self.rows_cropped += self._pending
+        self._pending = 0
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.input_bytes - self.output_bytes
+
+    @property
+    def print_ms_saved(self) -> float:
+        """Modeled print time saved versus sending every row as raster."""
+        raster_row_ms = row_ms(self._raster_speed, self._dpi)
+        # Feeding paper is never slower than printing on it
+        feed_row_ms = row_ms(max(FEED_SPEED_MM_S, self._raster_speed), self._dpi)
+        return (self.rows_cropped * raster_row_ms
+                + self.rows_fed * (raster_row_ms - feed_row_ms))
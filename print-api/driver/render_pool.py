@@ -0,0 +1,144 @@
+"""Optional process pool that renders jobs on every CPU core.
+
+Rendering custom fonts and images is CPU-bound Python/PIL work and holds
+the GIL, so the render thread uses one core however many the Pi has.
+With RENDER_WORKERS > 0 each job is built by build_escpos_commands() in
+a worker process instead. Workers are spawned at startup with fonts,
+glyphs and templates already loaded. A worker returns the job's bytes in
+a shared memory block, which the server copies out and unlinks, rather
+than pickling them back through the result pipe.
+
+Output is byte-for-byte the same as rendering in-process. Template
+render statistics in the admin API only count in-process renders.
+"""
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Any, Dict, Tuple
+
+import config
+from . import renderer
+from .escpos_builder import build_escpos_commands
+from .profiles import PrinterProfile
+from .template_store import get_store as get_template_store
+
+logger = logging.getLogger(__name__)
+
+# Body and header sizes pre-rasterized in each worker (see escpos_builder)
+WARM_FONT_SIZES = (24, 32)
+
+# Worker side: monotonic time of the last template rescan
+_last_refresh = 0.0
+
+
+def _init_worker():
+    global _last_refresh
+    renderer.warm_up(WARM_FONT_SIZES)
+    get_template_store()
+    _last_refresh = time.monotonic()
+
+
+def _refresh_templates() -> None:
+    """Pick up edited templates at most once per TEMPLATE_RELOAD_INTERVAL.
+
+    Workers have no watcher thread, so templated jobs poll for changes at
+    the same rate the server's watcher does (0 disables both).
+    """
+    global _last_refresh
+    interval = config.TEMPLATE_RELOAD_INTERVAL
+    now = time.monotonic()
+    if interval > 0 and now - _last_refresh >= interval:
+        _last_refresh = now
+        get_template_store().refresh()
+
+
+def _ping() -> None:
+    pass
+
+
+def _render(payload: Dict[str, Any], profile: PrinterProfile) -> Tuple[str, int, Dict[str, Any]]:
+    """Worker side: build the job into a new shared memory block."""
+    if payload.get('template'):
+        _refresh_templates()
+    metrics: Dict[str, Any] = {}
+    data = build_escpos_commands(payload, metrics, profile)
+    shm = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+    try:
+        shm.buf[:len(data)] = data
+    finally:
+        shm.close()
+    return shm.name, len(data), metrics
+
+
+def _take(name: str, size: int) -> bytes:
+    """Server side: copy a worker's output out and free the block."""
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return bytes(shm.buf[:size])
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+class RenderPool:
+    def __init__(self, workers: int):
+        self._workers = workers
+        self._lock = threading.Lock()
+        self._executor = self._create()
+
+    def _create(self) -> ProcessPoolExecutor:
+        # spawn, not fork: the server is already multi-threaded
+        return ProcessPoolExecutor(
+            max_workers=self._workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+        )
+
+    def warm(self):
+        """Start every worker now rather than on the first jobs."""
+        wait([self._executor.submit(_ping) for _ in range(self._workers)])
+        logger.info("Render pool ready (%d workers)", self._workers)
+
+    def _restart(self, broken: ProcessPoolExecutor):
+        with self._lock:
+            if self._executor is broken:
+                logger.error("Render worker died, restarting pool")
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._create()
+
+    def submit(self, payload: Dict[str, Any], profile: PrinterProfile, metrics: Dict[str, Any]) -> Future:
+        """Render a payload in a worker. Resolves to the job's ESC/POS bytes;
+        the worker's metrics are merged into `metrics` first."""
+        executor = self._executor
+        try:
+            inner = executor.submit(_render, payload, profile)
+        except BrokenProcessPool:
+            self._restart(executor)
+            executor = self._executor
+            inner = executor.submit(_render, payload, profile)
+
+        outer: Future = Future()
+
+        def _done(future: Future):
+            try:
+                name, size, worker_metrics = future.result()
+                data = _take(name, size)
+            except BrokenProcessPool as e:
+                self._restart(executor)
+                outer.set_exception(e)
+                return
+            except BaseException as e:
+                outer.set_exception(e)
+                return
+            metrics.update(worker_metrics)
+            outer.set_result(data)
+
+        inner.add_done_callback(_done)
+        return outer
+
+    def stop(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,39 +1,68 @@
 """Text-to-image rendering for custom font printing.
 
 Ported from printer/print_server_win32.py render_text_to_image().
-Font objects are cached at module level to avoid repeated disk reads on Pi.
+Font objects are cached at module level to avoid repeated disk reads on Pi,
+and glyphs are rasterized once into a shared GlyphAtlas. Lines a template
+prints on every receipt are kept as pre-rasterized fragments.
 """
 import os
+import string
 import logging
-import textwrap
-from typing import Optional, Dict
+from collections import OrderedDict
+from typing import AbstractSet, Optional, Dict, Iterable, Iterator, Tuple, Union
 
-from PIL import Image, ImageDraw, ImageFont
+import numpy as np
+from PIL import Image, ImageFont
 
 import config
+from .glyphs import GlyphAtlas, or_rows
+from .wrap import WrapEngine
 
 logger = logging.getLogger(__name__)
 
 # Module-level font cache: {font_path_size: ImageFont}
 _font_cache: Dict[str, ImageFont.FreeTypeFont] = {}
 
+# Module-level glyph atlas shared by all fonts and sizes
+_atlas = GlyphAtlas(config.GLYPH_CACHE_BYTES)
+
+# Module-level word-wrap engine (advance tables + wrapped-paragraph LRU)
+_wrapper = WrapEngine(config.WRAP_CACHE_SIZE)
+
+# Packed line rasters for static template lines:
+# {(font key, width, x, line): (top, rows)}
+_fragments: 'OrderedDict[tuple, Tuple[int, np.ndarray]]' = OrderedDict()
+
+# 'udc_sizes' lists the font sizes that fit the printer's 12x24 Font A
+# cell and may be downloaded as user-defined characters (see udc.py).
 FONT_FILES = {
     'montserrat': {
         'regular': 'Montserrat-Regular.ttf',
         'bold': 'Montserrat-Bold.ttf',
+        'udc_sizes': (14,),
     },
     'kings': {
         'regular': 'Kings-Regular.ttf',
         'bold': 'Kings-Regular.ttf',  # Kings has no bold variant
+        'udc_sizes': (),  # connected script glyphs don't survive fixed cells
     },
 }
 
 
-def _get_font(font_style: str, bold: bool, font_size: int) -> ImageFont.FreeTypeFont:
-    """Load a font, using the module-level cache."""
+def _font_key(font_style: str, bold: bool, font_size: int) -> Tuple[str, int]:
+    """Atlas key for a font: (font file, size).
+
+    Keyed on the file actually loaded, so styles that share a file (Kings
+    regular and bold) share their glyphs.
+    """
     variant = 'bold' if bold else 'regular'
     files = FONT_FILES.get(font_style, FONT_FILES['montserrat'])
-    filename = files[variant]
+    return files[variant], font_size
+
+
+def _get_font(font_style: str, bold: bool, font_size: int) -> ImageFont.FreeTypeFont:
+    """Load a font, using the module-level cache."""
+    filename, _ = _font_key(font_style, bold, font_size)
     cache_key = f"{filename}:{font_size}"
 
     if cache_key not in _font_cache:
@@ -47,48 +76,62 @@ def _get_font(font_style: str, bold: bool, font_size: int) -> ImageFont.FreeType
     return _font_cache[cache_key]
 
 
-def render_text_to_image(
-    text: str,
+def _line_strip(
+    font_key: tuple,
+    font: ImageFont.FreeTypeFont,
+    width: int,
+    line: str,
+    x: float,
+    static: bool,
+) -> Tuple[int, np.ndarray]:
+    """Packed raster rows for one line, reused across jobs for static lines."""
+    if not static:
+        return _atlas.line_strip(width, font_key, font, line, x)
+    key = (font_key, width, x, line)
+    strip = _fragments.get(key)
+    if strip is None:
+        strip = _fragments[key] = _atlas.line_strip(width, font_key, font, line, x)
+        if len(_fragments) > config.FRAGMENT_CACHE_SIZE:
+            _fragments.popitem(last=False)
+    else:
+        _fragments.move_to_end(key)
+    return strip
+
+
+def iter_text_bands(
+    text: Union[str, Iterable[str]],
     font_style: str = 'montserrat',
     bold: bool = False,
     width: int = 512,
     font_size: int = 24,
     align: str = 'left',
-) -> Optional[Image.Image]:
-    """Render text to a PIL Image using the specified font and alignment.
-
-    Returns None on failure.
+    band_rows: Optional[int] = None,
+    static_lines: AbstractSet[str] = frozenset(),
+) -> Iterator[np.ndarray]:
+    """Render text as a stream of packed raster bands.
+
+    `text` is a string or an iterable of lines, consumed lazily. Each
+    band is a uint8 array of `band_rows` rows (the last may be shorter)
+    in the same layout as render_text_to_raster(), yielded as soon as no
+    later line can draw into it. Memory stays bounded by the band height
+    whatever the text length. Paragraphs in `static_lines` (a template's
+    fixed text) are rasterized once and then copied. Raises on failure.
     """
-    try:
-        font = _get_font(font_style, bold, font_size)
-
-        # Create a dummy image to calculate text metrics
-        dummy_img = Image.new('RGB', (width, 1000))
-        draw = ImageDraw.Draw(dummy_img)
-
-        # Estimate characters per line from average character width
-        sample = "The quick brown fox jumps over the lazy dog"
-        avg_char_width = draw.textlength(sample, font=font) / len(sample)
-        chars_per_line = int(width / avg_char_width)
-
-        # Wrap text
-        lines = []
-        for paragraph in text.split('\n'):
-            wrapped = textwrap.wrap(paragraph, width=chars_per_line)
-            lines.extend(wrapped if wrapped else [''])
-
-        # Calculate total height
-        line_height = int(font_size * 1.2)
-        total_height = len(lines) * line_height + 20
-
-        # Create actual image
-        img = Image.new('RGB', (width, total_height), color='white')
-        draw = ImageDraw.Draw(img)
-
-        y = 10
-        for line in lines:
-            line_width = draw.textlength(line, font=font)
-
+    band_rows = band_rows or config.RASTER_BAND_ROWS
+    font = _get_font(font_style, bold, font_size)
+    font_key = _font_key(font_style, bold, font_size)
+    line_height = int(font_size * 1.2)
+    width_bytes = (width + 7) // 8
+
+    # Rolling window of page rows; buf[0] is page row buf_top
+    buf = np.zeros((band_rows + 2 * line_height, width_bytes), dtype=np.uint8)
+    buf_top = 0
+
+    paragraphs = text.split('\n') if isinstance(text, str) else text
+    y = 10
+    for paragraph in paragraphs:
+        static = paragraph in static_lines
+        for line, line_width in _wrapper.wrap(font_key, font, paragraph, width):
             if align == 'center':
                 x = (width - line_width) / 2
             elif align == 'right':
@@ -97,11 +140,109 @@ def render_text_to_image(
                 x = 0
 
             x = max(0, x)
-            draw.text((x, y), line, font=font, fill='black')
+            top, rows = _line_strip(font_key, font, width, line, x, static)
+            bottom = top + len(rows)
+            if y + bottom - buf_top > len(buf):
+                grow = y + bottom - buf_top - len(buf) + band_rows
+                buf = np.concatenate([buf, np.zeros((grow, width_bytes), dtype=np.uint8)])
+            or_rows(buf, rows, y + top - buf_top)
             y += line_height
 
-        return img
+            # Glyphs never reach a full line above their origin, so rows
+            # before that are final.
+            while y - line_height - buf_top >= band_rows:
+                yield buf[:band_rows]
+                buf = buf[band_rows:]
+                buf_top += band_rows
+
+    # 10px padding below the last line, as in the original renderer
+    end = y + 10 - buf_top
+    if end > len(buf):
+        buf = np.concatenate([buf, np.zeros((end - len(buf), width_bytes), dtype=np.uint8)])
+    for top in range(0, end, band_rows):
+        yield buf[top:min(top + band_rows, end)]
+
+
+def warm_up(font_sizes: Iterable[int]):
+    """Load every font and rasterize printable ASCII into the glyph atlas."""
+    sample = string.ascii_letters + string.digits + string.punctuation
+    for font_style in FONT_FILES:
+        for bold in (False, True):
+            for font_size in font_sizes:
+                render_text_to_raster(sample, font_style, bold, font_size=font_size)
 
+
+def render_text_to_raster(
+    text: str,
+    font_style: str = 'montserrat',
+    bold: bool = False,
+    width: int = 512,
+    font_size: int = 24,
+    align: str = 'left',
+) -> Optional[np.ndarray]:
+    """Render text straight into packed 1-bit raster rows.
+
+    Returns a uint8 array of shape (height, ceil(width / 8)), MSB first,
+    1 = black dot, ready for raster.encode_packed(). Returns None on failure.
+    """
+    try:
+        return np.concatenate(list(iter_text_bands(
+            text, font_style, bold, width, font_size, align)))
     except Exception as e:
         logger.error("Text rendering failed: %s", e)
         return None
+
+
+def rasterize_cell(
+    char: str,
+    font_style: str = 'montserrat',
+    bold: bool = False,
+    font_size: int = 14,
+    cell_width: int = 12,
+    cell_height: int = 24,
+) -> np.ndarray:
+    """Render one character into a fixed-height character cell.
+
+    Returns a boolean array (True = black dot) of shape
+    (cell_height, width), where width is the glyph advance capped at
+    cell_width. Glyphs wider than the cell are squeezed horizontally.
+    The font's ascent+descent is centred vertically in the cell.
+    """
+    font = _get_font(font_style, bold, font_size)
+    font_key = _font_key(font_style, bold, font_size)
+    glyph = _atlas.get(font_key, font, char)
+
+    ascent, descent = font.getmetrics()
+    top = max((cell_height - ascent - descent) // 2, 0)
+    gh, gw = glyph.height, glyph.width
+    left = max(glyph.left, 0)
+    width = max(int(round(glyph.advance)), left + gw, 1)
+
+    canvas = np.zeros((max(cell_height, top + glyph.top + gh), width), dtype=bool)
+    if gw:
+        y = max(top + glyph.top, 0)
+        canvas[y:y + gh, left:left + gw] = glyph.bitmap[:canvas.shape[0] - y]
+    canvas = canvas[:cell_height]
+
+    if width > cell_width:
+        canvas = canvas[:, (np.arange(cell_width) * width) // cell_width]
+    return canvas
+
+
+def render_text_to_image(
+    text: str,
+    font_style: str = 'montserrat',
+    bold: bool = False,
+    width: int = 512,
+    font_size: int = 24,
+    align: str = 'left',
+) -> Optional[Image.Image]:
+    """Render text to a mode '1' PIL Image using the specified font and alignment.
+
+    Returns None on failure.
+    """
+    page = render_text_to_raster(text, font_style, bold, width, font_size, align)
+    if page is None:
+        return None
+    dots = np.unpackbits(page, axis=1)[:, :width].astype(bool)
+    return Image.fromarray(~dots)
@@ -0,0 +1,280 @@
+"""Compiled receipt templates, preloaded and hot-reloaded.
+
+Every template in TEMPLATE_DIR is compiled once at startup, with Jinja2
+bytecode persisted to TEMPLATE_CACHE_DIR so restarts skip the parser.
+Lookups go to an in-memory table; a watcher thread polls file mtimes and
+recompiles only templates that changed. Compile and render timings are
+kept per template for the admin API.
+
+Compiling also finds a template's static lines: output that is the same
+on every render (rules, headings, fixed footers). The renderer keeps
+those as pre-rasterized fragments, so only the {{ }} slots are drawn
+per job.
+
+Templates mark lines for the custom font with the `raster` filter, e.g.
+{{ header | raster }}. In 'hybrid' render mode only marked lines are
+rasterized and the rest print in the printer's built-in font.
+"""
+import os
+import time
+import logging
+import threading
+from typing import Any, Dict, FrozenSet, Iterator, Optional
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template, nodes
+
+import config
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_SUFFIX = '.j2'
+
+# Prefix of a line the `raster` filter marked for the custom font
+RASTER_MARK = '\x1e'
+
+
+def mark_raster(value: Any) -> str:
+    """Jinja filter: print every line of `value` in the custom font."""
+    return '\n'.join(RASTER_MARK + line for line in str(value).split('\n'))
+
+
+# Placeholder for output that depends on template data
+_DYNAMIC = object()
+
+
+def find_static_lines(env: Environment, source: str) -> FrozenSet[str]:
+    """Non-blank output lines that every render of `source` produces verbatim.
+
+    Only top-level text and constant expressions count; anything inside a
+    loop, conditional or block, or that reads template data, is dynamic.
+    Lines are returned as printed, without the `raster` filter's marker.
+    """
+    eval_ctx = nodes.EvalContext(env)
+    pieces = []
+    for node in env.parse(source).body:
+        if isinstance(node, nodes.Output):
+            for child in node.nodes:
+                if isinstance(child, nodes.TemplateData):
+                    pieces.append(child.data)
+                    continue
+                try:
+                    pieces.append(str(child.as_const(eval_ctx)))
+                except Exception:
+                    pieces.append(_DYNAMIC)
+        elif not isinstance(node, nodes.Assign):
+            pieces.append(_DYNAMIC)
+
+    lines = set()
+    current, dynamic = [], False
+    for piece in pieces + ['\n']:
+        if piece is _DYNAMIC:
+            dynamic = True
+            continue
+        for i, part in enumerate(piece.split('\n')):
+            if i:
+                line = ''.join(current)
+                if not dynamic and line.strip():
+                    lines.add(line[1:] if line.startswith(RASTER_MARK) else line)
+                current, dynamic = [], False
+            current.append(part)
+    return frozenset(lines)
+
+
+class _Entry:
+    __slots__ = ('template', 'static_lines', 'mtime', 'compile_ms',
+                 'renders', 'render_ms_total', 'render_ms_max')
+
+    def __init__(self, template: Template, static_lines: FrozenSet[str], mtime: float, compile_ms: float):
+        self.template = template
+        self.static_lines = static_lines
+        self.mtime = mtime
+        self.compile_ms = compile_ms
+        self.renders = 0
+        self.render_ms_total = 0.0
+        self.render_ms_max = 0.0
+
+
+class TemplateStore:
+    def __init__(self, template_dir: str, cache_dir: Optional[str] = None):
+        self._dir = template_dir
+        bytecode_cache = None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(cache_dir)
+        self._env = Environment(
+            loader=FileSystemLoader(template_dir),
+            autoescape=False,
+            bytecode_cache=bytecode_cache,
+            auto_reload=False,
+        )
+        self._env.filters['raster'] = mark_raster
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _scan(self) -> Dict[str, float]:
+        """Template name (without suffix) -> file mtime."""
+        found = {}
+        for filename in os.listdir(self._dir):
+            if filename.endswith(TEMPLATE_SUFFIX):
+                path = os.path.join(self._dir, filename)
+                found[filename[:-len(TEMPLATE_SUFFIX)]] = os.path.getmtime(path)
+        return found
+
+    def _compile(self, name: str, mtime: float) -> Optional[_Entry]:
+        filename = name + TEMPLATE_SUFFIX
+        start = time.perf_counter()
+        try:
+            # Loader.load goes through the bytecode cache but not the
+            # environment's own template cache, so edits are picked up
+            template = self._env.loader.load(self._env, filename)
+            source, _, _ = self._env.loader.get_source(self._env, filename)
+            static_lines = find_static_lines(self._env, source)
+        except Exception as e:
+            logger.error("Template %s failed to compile: %s", name, e)
+            return None
+        compile_ms = (time.perf_counter() - start) * 1000
+        logger.info("Template %s compiled in %.1f ms (%d static lines)",
+                    name, compile_ms, len(static_lines))
+        return _Entry(template, static_lines, mtime, compile_ms)
+
+    def refresh(self) -> int:
+        """Compile new or modified templates and drop deleted ones.
+
+        Returns the number of templates (re)compiled.
+        """
+        try:
+            found = self._scan()
+        except OSError as e:
+            logger.error("Cannot scan template directory %s: %s", self._dir, e)
+            return 0
+
+        with self._lock:
+            stale = {name: mtime for name, mtime in found.items()
+                     if name not in self._entries or self._entries[name].mtime != mtime}
+            removed = [name for name in self._entries if name not in found]
+
+        compiled = {}
+        for name, mtime in stale.items():
+            entry = self._compile(name, mtime)
+            if entry is not None:
+                compiled[name] = entry
+
+        with self._lock:
+            self._entries.update(compiled)
+            if compiled and self._env.cache is not None:
+                # Includes and imports resolve through the environment cache
+                self._env.cache.clear()
+            for name in removed:
+                del self._entries[name]
+                logger.info("Template %s removed", name)
+        return len(compiled)
+
+    def start_watcher(self, interval: float):
+        """Poll for template changes every `interval` seconds (0 disables)."""
+        if interval <= 0 or self._watcher is not None:
+            return
+
+        def _watch():
+            while not self._stop.wait(interval):
+                self.refresh()
+
+        self._watcher = threading.Thread(target=_watch, name="template-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _lookup(self, name: str) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry is None:
+            # Added since the last refresh, or never preloaded
+            self.refresh()
+            with self._lock:
+                entry = self._entries.get(name)
+            if entry is None:
+                raise KeyError(f"Unknown template '{name}'")
+        return entry
+
+    def render_stream(self, name: str, data: Dict[str, Any]) -> 'RenderStream':
+        """Start rendering a template lazily, chunk by chunk (Template.generate)."""
+        entry = self._lookup(name)
+        return RenderStream(self, entry, entry.template.new_context(data))
+
+    def _record_render(self, entry: _Entry, elapsed_ms: float):
+        with self._lock:
+            entry.renders += 1
+            entry.render_ms_total += elapsed_ms
+            entry.render_ms_max = max(entry.render_ms_max, elapsed_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                name: {
+                    "compile_ms": round(entry.compile_ms, 3),
+                    "static_lines": len(entry.static_lines),
+                    "renders": entry.renders,
+                    "render_ms_avg": round(entry.render_ms_total / entry.renders, 3)
+                    if entry.renders else None,
+                    "render_ms_max": round(entry.render_ms_max, 3),
+                }
+                for name, entry in sorted(self._entries.items())
+            }
+
+    def __contains__(self, name: str) -> bool:
+        with self._lock:
+            return name in self._entries
+
+
+class RenderStream:
+    """Lazily rendered template output.
+
+    Iterating yields text chunks as Jinja produces them. `vars` holds the
+    template's top-level variables as rendering reaches them, so a
+    {% set %} before the first output line is visible after one chunk.
+    Render time counts only the time spent inside the template.
+    """
+
+    def __init__(self, store: TemplateStore, entry: _Entry, context):
+        self._store = store
+        self._entry = entry
+        self._context = context
+        self.static_lines = entry.static_lines
+
+    @property
+    def vars(self) -> Dict[str, Any]:
+        return self._context.vars
+
+    def __iter__(self) -> Iterator[str]:
+        template = self._entry.template
+        chunks = template.root_render_func(self._context)
+        elapsed = 0.0
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                break
+            except Exception:
+                # Same traceback rewriting as Template.generate()
+                template.environment.handle_exception()
+            finally:
+                elapsed += time.perf_counter() - start
+            yield chunk
+        self._store._record_render(self._entry, elapsed * 1000)
+
+
+_store: Optional[TemplateStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> TemplateStore:
+    """The process-wide template store, created and preloaded on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TemplateStore(config.TEMPLATE_DIR, config.TEMPLATE_CACHE_DIR)
+            _store.refresh()
+        return _store
@@ -0,0 +1,111 @@
+"""User-defined characters: print custom fonts as single-byte codes.
+
+Printable ASCII in an eligible font and size (renderer.FONT_FILES
+'udc_sizes') is rasterized once into 12x24 Font A cells and downloaded
+with ESC &. Text then prints as ordinary bytes under ESC % 1 instead of
+as kilobytes of raster per line.
+
+ESC @ clears downloaded characters, and every job starts with ESC @, so
+definitions travel with each job. Only the glyphs the job actually uses
+are sent, and a reconnected or power-cycled printer needs no extra
+resync.
+"""
+import logging
+from typing import Dict, Optional, Set, Tuple
+
+import numpy as np
+
+import config
+from .renderer import FONT_FILES, rasterize_cell
+
+logger = logging.getLogger(__name__)
+
+ESC = b"\x1B"
+ESC_UDC_ON = b"\x1B\x25\x01"
+ESC_UDC_OFF = b"\x1B\x25\x00"
+
+# Font A character cell and the code range ESC & can redefine
+CELL_WIDTH = 12
+CELL_HEIGHT = 24
+FIRST_CODE = 0x20
+LAST_CODE = 0x7E
+
+# {(font_style, bold, font_size): {char: x + column data}}
+_charsets: Dict[Tuple[str, bool, int], Dict[str, bytes]] = {}
+
+
+def font_eligible(font_style: str, font_size: int) -> bool:
+    """True if this printer and font size can use user-defined characters."""
+    if not config.PRINTER_UDC:
+        return False
+    return font_size in FONT_FILES.get(font_style, {}).get('udc_sizes', ())
+
+
+def is_eligible(text: str, font_style: str, font_size: int) -> bool:
+    """True if `text` can be printed as user-defined characters."""
+    if not font_eligible(font_style, font_size):
+        return False
+    return all(FIRST_CODE <= ord(ch) <= LAST_CODE for ch in text if ch != '\n')
+
+
+def _encode_cell(cell: np.ndarray) -> bytes:
+    """x byte followed by column-major data, 3 bytes per 24-dot column."""
+    columns = np.packbits(cell.T, axis=1)
+    return bytes((cell.shape[1],)) + columns.tobytes()
+
+
+def _charset(font_style: str, bold: bool, font_size: int) -> Dict[str, bytes]:
+    key = (font_style, bold, font_size)
+    charset = _charsets.get(key)
+    if charset is None:
+        charset = {
+            chr(code): _encode_cell(rasterize_cell(
+                chr(code), font_style, bold, font_size, CELL_WIDTH, CELL_HEIGHT))
+            for code in range(FIRST_CODE, LAST_CODE + 1)
+        }
+        _charsets[key] = charset
+        logger.info("Rasterized user-defined character set %s", key)
+    return charset
+
+
+def define_characters(
+    text: str, font_style: str, bold: bool, font_size: int, defined: Optional[Set[str]] = None,
+) -> bytes:
+    """ESC & commands defining every distinct character used in `text`.
+
+    Characters already in `defined` are skipped; new ones are added to it.
+    """
+    charset = _charset(font_style, bold, font_size)
+    chars = set(text) - {'\n'}
+    if defined is not None:
+        chars -= defined
+    codes = sorted(ord(ch) for ch in chars)
+    out = []
+    start = 0
+    # One ESC & per run of consecutive codes
+    for i in range(1, len(codes) + 1):
+        if i == len(codes) or codes[i] != codes[i - 1] + 1:
+            c1, c2 = codes[start], codes[i - 1]
+            out.append(ESC + b"&" + bytes((CELL_HEIGHT // 8, c1, c2)))
+            out.extend(charset[chr(code)] for code in range(c1, c2 + 1))
+            start = i
+    if defined is not None:
+        defined |= chars
+    return b"".join(out)
+
+
+def encode_text(
+    text: str, font_style: str, bold: bool, font_size: int, defined: Optional[Set[str]] = None,
+) -> Optional[bytes]:
+    """Define the needed glyphs and print `text` with them.
+
+    Pass the same `defined` set for successive pieces of one job so each
+    glyph is downloaded only once. Returns None if rasterizing the glyphs
+    fails, so the caller can fall back to raster output.
+    """
+    try:
+        definitions = define_characters(text, font_style, bold, font_size, defined)
+    except Exception as e:
+        logger.error("User-defined character setup failed: %s", e)
+        return None
+    return definitions + ESC_UDC_ON + text.encode('ascii') + b"\n" + ESC_UDC_OFF
@@ -0,0 +1,126 @@
+"""Pixel-accurate word wrap driven by cached glyph advance tables.
+
+Advances are measured once per (font, character) and a paragraph is laid
+out from their prefix sums, so wrapping costs O(n) array work instead of
+one FreeType measurement per candidate line. Wrapped paragraphs are
+memoized in an LRU since receipts repeat the same lines constantly.
+
+Line-breaking rules follow textwrap.wrap: break at spaces or after
+hyphens, drop whitespace around breaks (but keep a paragraph's leading
+indent), and split words that are wider than the line. Unlike textwrap,
+an over-wide word starts on a fresh line rather than filling the end of
+the previous one.
+"""
+import logging
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Tuple
+
+import numpy as np
+from PIL import ImageFont
+
+logger = logging.getLogger(__name__)
+
+# A wrapped line and its width in pixels
+Line = Tuple[str, float]
+
+
+def _break_points(text: str) -> np.ndarray:
+    """Indices where a line may end: before a space run or after a hyphen.
+
+    As in textwrap, a hyphen only breaks inside a compound word whose
+    first part is at least two characters ending in a letter ("well-known",
+    not "x-ray").
+    """
+    points = []
+    for i in range(1, len(text)):
+        ch, prev = text[i], text[i - 1]
+        if ch == ' ' and prev != ' ':
+            points.append(i)
+        elif (prev == '-' and i >= 3 and ch.isalnum()
+              and text[i - 2].isalpha() and text[i - 3].isalnum()):
+            points.append(i)
+    return np.array(points, dtype=np.intp)
+
+
+class WrapEngine:
+    """Word wrapper with per-font advance tables and a line-layout LRU."""
+
+    def __init__(self, max_entries: int):
+        self._max_entries = max_entries
+        self._advances: Dict[Hashable, Dict[str, float]] = {}
+        self._wrapped: 'OrderedDict[Tuple[Hashable, int, str], List[Line]]' = OrderedDict()
+
+    def _prefix_widths(self, font_key: Hashable, font: ImageFont.FreeTypeFont, text: str) -> np.ndarray:
+        """pos[i] is the x offset of character i; pos[-1] is the full width."""
+        table = self._advances.setdefault(font_key, {})
+        advances = np.empty(len(text) + 1)
+        advances[0] = 0.0
+        for i, ch in enumerate(text, 1):
+            advance = table.get(ch)
+            if advance is None:
+                advance = table[ch] = font.getlength(ch)
+            advances[i] = advance
+        return np.cumsum(advances)
+
+    def wrap(
+        self,
+        font_key: Hashable,
+        font: ImageFont.FreeTypeFont,
+        paragraph: str,
+        width: int,
+    ) -> List[Line]:
+        """Wrap one paragraph (no newlines) to `width` pixels."""
+        key = (font_key, width, paragraph)
+        lines = self._wrapped.get(key)
+        if lines is not None:
+            self._wrapped.move_to_end(key)
+            return lines
+
+        lines = self._layout(font_key, font, paragraph, width)
+        self._wrapped[key] = lines
+        if len(self._wrapped) > self._max_entries:
+            self._wrapped.popitem(last=False)
+        return lines
+
+    def _layout(
+        self,
+        font_key: Hashable,
+        font: ImageFont.FreeTypeFont,
+        text: str,
+        width: int,
+    ) -> List[Line]:
+        if not text.strip(' '):
+            return [('', 0.0)]
+
+        pos = self._prefix_widths(font_key, font, text)
+        breaks = _break_points(text)
+        n = len(text)
+        lines: List[Line] = []
+        start = 0
+
+        while start < n:
+            # Furthest end index whose text still fits on this line
+            end = int(np.searchsorted(pos, pos[start] + width, side='right')) - 1
+            if end >= n:
+                stop = len(text.rstrip(' '))
+                lines.append((text[start:stop], pos[stop] - pos[start]))
+                break
+
+            i = int(np.searchsorted(breaks, end, side='right')) - 1
+            if i >= 0 and breaks[i] > start:
+                stop = int(breaks[i])
+            else:
+                # No break opportunity: split the word, at least one character
+                stop = max(end, start + 1)
+
+            segment = text[start:stop].rstrip(' ')
+            lines.append((segment, pos[start + len(segment)] - pos[start]))
+
+            start = stop
+            while start < n and text[start] == ' ':
+                start += 1
+
+        return lines
+
+    def __len__(self) -> int:
+        return len(self._wrapped)
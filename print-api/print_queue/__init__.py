@@ -1,2 +1,5 @@
 from .job import PrintJob, JobState
 from .manager import JobQueue
+from .journal import JobJournal
+from .registry import JobRecord, JobRegistry
+from .merge import MergeManager, MergeRun, MergeState
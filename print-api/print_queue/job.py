@@ -23,3 +23,5 @@ class PrintJob:
     error: Optional[str] = None
     client_ip: Optional[str] = None
     is_raw: bool = False
+    priority: str = 'normal'  # urgent, normal or bulk (see scheduler.py)
+    metrics: Dict[str, Any] = field(default_factory=dict)
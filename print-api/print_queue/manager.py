@@ -1,78 +1,225 @@
 import time
 import threading
 import logging
+from concurrent.futures import Future
 from queue import Queue, Full, Empty
-from typing import Optional, Dict, Callable
+from typing import Optional, Dict, Callable, Iterable, Tuple, Union
 
 from .job import PrintJob, JobState
+from .journal import JobJournal
+from .pipeline import ByteBudget, ChunkPipe
+from .registry import JobRecord, JobRegistry
+from .scheduler import FairQueue
 
 logger = logging.getLogger(__name__)
 
 
 class JobQueue:
-    def __init__(self, max_depth: int = 20, job_timeout: float = 30.0):
-        self._queue: Queue[PrintJob] = Queue(maxsize=max_depth)
-        self._jobs: Dict[str, PrintJob] = {}
-        self._lock = threading.Lock()
+    """Print queue with priority classes and per-client fair scheduling.
+
+    Each class holds up to `max_depth` jobs unless `class_depths` says
+    otherwise; see scheduler.FairQueue for the order jobs are taken in.
+
+    Without a render callback a single consumer builds and prints each
+    job in turn. With one, printing is pipelined: a render thread turns
+    queued payloads into ESC/POS chunks while the consumer writes the
+    previous job, so the next receipt is ready the moment the printer
+    is. Up to `render_ahead` jobs and `render_buffer` bytes of rendered
+    output may wait for the printer; they print in the order scheduled.
+
+    With a `journal`, job transitions are persisted and jobs left
+    unfinished by the previous run are queued again on start().
+    Finished jobs stay visible to get_job() as compact records in
+    `registry` (default: JobRegistry()).
+    """
+
+    def __init__(
+        self,
+        max_depth: int = 20,
+        job_timeout: float = 30.0,
+        print_mode: str = 'normal',
+        render_ahead: int = 2,
+        render_buffer: int = 4 * 1024 * 1024,
+        journal: Optional[JobJournal] = None,
+        class_depths: Optional[Dict[str, int]] = None,
+        client_share: float = 1.0,
+        client_weights: Optional[Dict[str, float]] = None,
+        registry: Optional[JobRegistry] = None,
+    ):
+        capacities = {'urgent': max_depth, 'normal': max_depth, 'bulk': max_depth}
+        capacities.update(class_depths or {})
+        self._queue = FairQueue(capacities, client_share, client_weights)
+        self._ready: Queue[Tuple[PrintJob, ChunkPipe]] = Queue(maxsize=max(1, render_ahead))
+        self._budget = ByteBudget(render_buffer)
+        self._registry = registry or JobRegistry()
         self._consumer_thread: Optional[threading.Thread] = None
+        self._render_thread: Optional[threading.Thread] = None
         self._shutdown = threading.Event()
         self._printer_callback: Optional[Callable] = None
+        self._render_callback: Optional[Callable] = None
         self._job_timeout = job_timeout
-
-    def start(self, printer_callback: Callable[[PrintJob], None]):
-        """Start the consumer thread. printer_callback(job) does the actual printing."""
+        self._print_mode = print_mode
+        self._journal = journal
+
+    def start(
+        self,
+        printer_callback: Callable[..., None],
+        render_callback: Optional[Callable[[PrintJob], Iterable[bytes]]] = None,
+    ):
+        """Start the consumer thread. printer_callback(job) does the actual printing.
+
+        If render_callback(job) is given, a render thread runs it ahead of
+        the printer and the consumer calls printer_callback(job, chunks)
+        with its output instead. A render_callback may also return a
+        Future of the job's bytes; up to `render_ahead` such jobs then
+        render concurrently.
+        """
         self._printer_callback = printer_callback
+        self._render_callback = render_callback
+        if self._journal is not None:
+            self._replay()
+        if render_callback is not None:
+            self._render_thread = threading.Thread(
+                target=self._render_loop,
+                name="print-render",
+                daemon=True,
+            )
+            self._render_thread.start()
         self._consumer_thread = threading.Thread(
             target=self._consumer_loop,
             name="print-consumer",
             daemon=True,
         )
         self._consumer_thread.start()
-        logger.info("Print queue consumer started")
+        logger.info("Print queue consumer started%s",
+                    " (pipelined rendering)" if render_callback else "")
 
     def stop(self):
         """Signal shutdown and wait for consumer to finish current job."""
         self._shutdown.set()
         if self._consumer_thread and self._consumer_thread.is_alive():
             self._consumer_thread.join(timeout=self._job_timeout + 5)
+        if self._journal is not None:
+            self._journal.close()
+
+    def _replay(self):
+        """Queue the previous run's unfinished jobs, oldest first, ahead of new ones."""
+        jobs = self._journal.unfinished()
+        if not jobs:
+            return
+        # Replayed jobs may exceed a class's depth; new submissions wait for them to drain
+        for job in jobs:
+            self._registry.add(job)
+            self._queue.put_nowait(job, force=True)
+        logger.warning("Replaying %d unfinished job(s) from the journal", len(jobs))
 
     def submit(self, job: PrintJob) -> bool:
         """Submit a job. Returns True if accepted, False if queue is full."""
+        if not job.is_raw:
+            job.payload.setdefault('print_mode', self._print_mode)
+        # Recorded before the consumer can see it, so transitions stay in order
+        self._registry.add(job)
+        if self._journal is not None:
+            self._journal.submitted(job)
         try:
             self._queue.put_nowait(job)
         except Full:
+            self._registry.discard(job.id)
+            if self._journal is not None:
+                self._journal.finished(job)
             return False
-        with self._lock:
-            self._jobs[job.id] = job
-        logger.info("Job %s queued (depth=%d)", job.id, self._queue.qsize())
+        logger.info("Job %s queued (%s, depth=%d)", job.id, job.priority, self._queue.qsize())
         return True
 
-    def get_job(self, job_id: str) -> Optional[PrintJob]:
-        """Look up a job by ID for status queries."""
-        with self._lock:
-            return self._jobs.get(job_id)
+    def get_job(self, job_id: str) -> Optional[Union[PrintJob, JobRecord]]:
+        """Look up a job by ID for status queries (a JobRecord once finished)."""
+        return self._registry.get(job_id)
+
+    def registry_stats(self) -> Dict[str, int]:
+        return self._registry.stats()
 
     @property
     def depth(self) -> int:
-        return self._queue.qsize()
+        return self._queue.qsize() + self._ready.qsize()
+
+    def class_depths(self) -> Dict[str, int]:
+        """Jobs waiting per priority class (not counting rendered-ahead jobs)."""
+        return self._queue.depths()
+
+    def _render_loop(self):
+        """Render stage: hands each job's output to the consumer as it is produced."""
+        while not self._shutdown.is_set():
+            try:
+                job = self._queue.get(timeout=1.0)
+            except Empty:
+                continue
+
+            pipe = ChunkPipe(self._budget)
+            # Blocks while `render_ahead` jobs are already waiting
+            while not self._shutdown.is_set():
+                try:
+                    self._ready.put((job, pipe), timeout=1.0)
+                    break
+                except Full:
+                    continue
+            self._queue.task_done()
+
+            error = None
+            start = time.perf_counter()
+            try:
+                rendered = self._render_callback(job)
+                if isinstance(rendered, Future):
+                    # Rendered elsewhere (process pool): take the next job now
+                    rendered.add_done_callback(
+                        lambda future, job=job, pipe=pipe: self._deliver(job, pipe, future, start))
+                    continue
+                for chunk in rendered:
+                    if not pipe.put(chunk):
+                        break
+            except Exception as e:
+                logger.error("Job %s rendering failed: %s", job.id, e)
+                error = e
+            job.metrics['render_ms'] = round((time.perf_counter() - start) * 1000, 3)
+            pipe.close(error)
+
+    @staticmethod
+    def _deliver(job: PrintJob, pipe: ChunkPipe, future: Future, start: float):
+        """Hand a job rendered out of process to its waiting pipe."""
+        error = future.exception()
+        if error is None:
+            pipe.put(future.result(), block=False)
+        else:
+            logger.error("Job %s rendering failed: %s", job.id, error)
+        job.metrics['render_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        pipe.close(error)
+
+    def _next_job(self) -> Tuple[PrintJob, Optional[ChunkPipe]]:
+        if self._render_callback is None:
+            return self._queue.get(timeout=1.0), None
+        return self._ready.get(timeout=1.0)
 
     def _consumer_loop(self):
         """Single consumer: pulls jobs one at a time, calls printer_callback."""
         while not self._shutdown.is_set():
             try:
-                job = self._queue.get(timeout=1.0)
+                job, pipe = self._next_job()
             except Empty:
                 continue
 
             job.state = JobState.PRINTING
             job.started_at = time.monotonic()
             logger.info("Job %s printing", job.id)
+            if self._journal is not None:
+                self._journal.started(job)
 
             exc_container: list = [None]
 
             def _do_print():
                 try:
-                    self._printer_callback(job)
+                    if pipe is None:
+                        self._printer_callback(job)
+                    else:
+                        self._printer_callback(job, pipe)
                 except Exception as e:
                     exc_container[0] = e
 
@@ -95,19 +242,11 @@ class JobQueue:
                 job.completed_at = time.monotonic()
                 logger.info("Job %s done", job.id)
 
-            self._queue.task_done()
-            self._evict_old_jobs()
-
-    def _evict_old_jobs(self, max_age: float = 300.0):
-        """Remove completed jobs older than max_age seconds from the lookup dict."""
-        now = time.monotonic()
-        with self._lock:
-            stale = [
-                jid
-                for jid, j in self._jobs.items()
-                if j.state in (JobState.DONE, JobState.ERROR)
-                and j.completed_at
-                and (now - j.completed_at) > max_age
-            ]
-            for jid in stale:
-                del self._jobs[jid]
+            if self._journal is not None:
+                self._journal.finished(job)
+            self._registry.finish(job)
+            if pipe is None:
+                self._queue.task_done()
+            elif job.state == JobState.ERROR:
+                # Stop rendering what will never be printed
+                pipe.abandon()
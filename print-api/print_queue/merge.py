@@ -0,0 +1,231 @@
+"""Bulk mail-merge runs: one template printed with many rows of data.
+
+A run spools the uploaded JSONL or CSV body to a temporary file, then a
+runner thread parses it one row at a time and feeds the regular job
+queue. Only a few rows are queued at once, so ordinary jobs interleave
+with a long run instead of waiting behind it, rows go out at the speed
+the printer takes them, and memory is bounded by the spool file rather
+than the number of rows.
+"""
+import io
+import csv
+import json
+import time
+import uuid
+import logging
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, BinaryIO, Deque, Dict, Iterator, List, Optional, Tuple
+
+from .job import PrintJob, JobState
+from .manager import JobQueue
+
+logger = logging.getLogger(__name__)
+
+MERGE_FORMATS = ('jsonl', 'csv')
+
+# Failed rows reported back per run
+MAX_REPORTED_FAILURES = 100
+
+# Finished runs kept for status queries
+MAX_FINISHED_RUNS = 20
+
+# How often the runner checks on queued rows and a full queue
+_POLL_INTERVAL = 0.05
+_QUEUE_FULL_BACKOFF = 0.5
+
+
+class MergeState(Enum):
+    RUNNING = "running"
+    DONE = "done"
+    CANCELLED = "cancelled"
+    ERROR = "error"
+
+
+@dataclass
+class MergeRun:
+    template: str
+    fmt: str
+    options: Dict[str, Any]
+    client_ip: Optional[str] = None
+    priority: str = 'bulk'
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    state: MergeState = MergeState.RUNNING
+    rows_read: int = 0
+    rows_printed: int = 0
+    rows_failed: int = 0
+    failures: List[Dict[str, Any]] = field(default_factory=list)
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.monotonic)
+    completed_at: Optional[float] = None
+    cancel_requested: bool = False
+
+    def fail_row(self, row: int, error: str):
+        self.rows_failed += 1
+        if len(self.failures) < MAX_REPORTED_FAILURES:
+            self.failures.append({"row": row, "error": error})
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.completed_at or time.monotonic()
+        return {
+            "merge_id": self.id,
+            "template": self.template,
+            "state": self.state.value,
+            "rows_read": self.rows_read,
+            "rows_printed": self.rows_printed,
+            "rows_failed": self.rows_failed,
+            "failures": self.failures,
+            "error": self.error,
+            "elapsed_s": round(end - self.created_at, 1),
+        }
+
+
+def iter_rows(spool: BinaryIO, fmt: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """Yield (row number, template_data, error) for each row, parsed lazily.
+
+    Row numbers are 1-based data rows (the CSV header is not counted).
+    Blank JSONL lines are skipped.
+    """
+    text = io.TextIOWrapper(spool, encoding='utf-8', newline='')
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(text), 1):
+            if None in row:
+                yield number, None, "More fields than header columns"
+            else:
+                yield number, row, None
+        return
+
+    number = 0
+    for line in text:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            yield number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(data, dict):
+            yield number, None, "Row must be a JSON object"
+        else:
+            yield number, data, None
+
+
+class MergeManager:
+    def __init__(self, job_queue: JobQueue, inflight: int = 2):
+        self._queue = job_queue
+        self._inflight = max(1, inflight)
+        self._runs: 'OrderedDict[str, MergeRun]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(
+        self,
+        template: str,
+        fmt: str,
+        body: BinaryIO,
+        options: Dict[str, Any],
+        client_ip: Optional[str] = None,
+        priority: str = 'bulk',
+    ) -> MergeRun:
+        """Spool `body` to disk and start printing it in the background."""
+        spool = tempfile.TemporaryFile()
+        try:
+            while True:
+                chunk = body.read(64 * 1024)
+                if not chunk:
+                    break
+                spool.write(chunk)
+            spool.seek(0)
+        except Exception:
+            spool.close()
+            raise
+
+        run = MergeRun(template=template, fmt=fmt, options=options, client_ip=client_ip,
+                       priority=priority)
+        with self._lock:
+            self._runs[run.id] = run
+            self._evict_finished()
+
+        threading.Thread(
+            target=self._run, args=(run, spool), name=f"merge-{run.id}", daemon=True,
+        ).start()
+        logger.info("Merge %s started: template %s (%s)", run.id, template, fmt)
+        return run
+
+    def get(self, merge_id: str) -> Optional[MergeRun]:
+        with self._lock:
+            return self._runs.get(merge_id)
+
+    def cancel(self, merge_id: str) -> Optional[MergeRun]:
+        """Stop feeding rows; rows already queued still print."""
+        run = self.get(merge_id)
+        if run is not None:
+            run.cancel_requested = True
+        return run
+
+    def stop(self):
+        with self._lock:
+            for run in self._runs.values():
+                run.cancel_requested = True
+
+    def _run(self, run: MergeRun, spool: BinaryIO):
+        pending: Deque[Tuple[int, PrintJob]] = deque()
+        try:
+            with spool:
+                for number, data, error in iter_rows(spool, run.fmt):
+                    if run.cancel_requested:
+                        break
+                    run.rows_read += 1
+                    if error:
+                        run.fail_row(number, error)
+                        continue
+
+                    job = PrintJob(
+                        payload=dict(run.options, template=run.template, template_data=data),
+                        client_ip=run.client_ip,
+                        priority=run.priority,
+                    )
+                    if not self._submit(run, job):
+                        break
+                    pending.append((number, job))
+                    while len(pending) >= self._inflight:
+                        self._reap(run, pending.popleft())
+            while pending:
+                self._reap(run, pending.popleft())
+        except Exception as e:
+            run.error = str(e)
+            run.state = MergeState.ERROR
+            logger.error("Merge %s failed: %s", run.id, e)
+        else:
+            run.state = MergeState.CANCELLED if run.cancel_requested else MergeState.DONE
+        run.completed_at = time.monotonic()
+        logger.info("Merge %s %s: %d printed, %d failed",
+                    run.id, run.state.value, run.rows_printed, run.rows_failed)
+
+    def _submit(self, run: MergeRun, job: PrintJob) -> bool:
+        """Queue one row, waiting while the queue is full. False if cancelled."""
+        while not self._queue.submit(job):
+            if run.cancel_requested:
+                return False
+            time.sleep(_QUEUE_FULL_BACKOFF)
+        return True
+
+    def _reap(self, run: MergeRun, queued: Tuple[int, PrintJob]):
+        """Wait for a queued row to finish printing and record the outcome."""
+        number, job = queued
+        while job.state in (JobState.QUEUED, JobState.PRINTING):
+            time.sleep(_POLL_INTERVAL)
+        if job.state != JobState.DONE:
+            run.fail_row(number, job.error or "Print failed")
+        elif job.metrics.get('template_error'):
+            run.fail_row(number, f"Template error: {job.metrics['template_error']}")
+        else:
+            run.rows_printed += 1
+
+    def _evict_finished(self):
+        finished = [rid for rid, r in self._runs.items() if r.state != MergeState.RUNNING]
+        for rid in finished[:max(0, len(finished) - MAX_FINISHED_RUNS)]:
+            del self._runs[rid]
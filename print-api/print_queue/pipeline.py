@@ -0,0 +1,96 @@
+"""Hand-off between the render stage and the printer writer.
+
+Each job's ESC/POS output travels through a ChunkPipe: the render thread
+puts chunks in as iter_escpos_commands() produces them and the writer
+sends them as they arrive. A job that is being written streams exactly
+as before, while the render thread is free to start on the next job as
+soon as this one is rendered. All pipes share one ByteBudget, which caps
+how much rendered output may wait for the printer.
+"""
+import threading
+from collections import deque
+from typing import Deque, Iterator, Optional
+
+
+class ByteBudget:
+    """Counting limit on bytes rendered but not yet written."""
+
+    def __init__(self, limit: int):
+        self._limit = limit
+        self._used = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, size: int, block: bool = True):
+        """Block until `size` bytes fit. A chunk larger than the whole
+        budget is let through once nothing else is buffered."""
+        with self._cond:
+            while block and self._used and self._used + size > self._limit:
+                self._cond.wait()
+            self._used += size
+
+    def release(self, size: int):
+        with self._cond:
+            self._used -= size
+            self._cond.notify_all()
+
+    @property
+    def used(self) -> int:
+        return self._used
+
+
+class ChunkPipe:
+    """One job's output chunks, written by the render stage, read by the writer."""
+
+    def __init__(self, budget: ByteBudget):
+        self._budget = budget
+        self._chunks: Deque[bytes] = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        self._abandoned = False
+
+    def put(self, chunk: bytes, block: bool = True) -> bool:
+        """Queue a chunk for the writer. False once the writer has given up.
+
+        With block=False the chunk is counted against the budget but
+        never waits for room (for callbacks that must not stall).
+        """
+        if self._abandoned:
+            return False
+        self._budget.acquire(len(chunk), block)
+        with self._cond:
+            if self._abandoned:
+                self._budget.release(len(chunk))
+                return False
+            self._chunks.append(chunk)
+            self._cond.notify()
+        return True
+
+    def close(self, error: Optional[BaseException] = None):
+        """Mark the job fully rendered, or failed with `error`."""
+        with self._cond:
+            self._closed = True
+            self._error = error
+            self._cond.notify()
+
+    def __iter__(self) -> Iterator[bytes]:
+        while True:
+            with self._cond:
+                while not self._chunks and not self._closed:
+                    self._cond.wait()
+                if not self._chunks:
+                    if self._error is not None:
+                        raise self._error
+                    return
+                chunk = self._chunks.popleft()
+            self._budget.release(len(chunk))
+            yield chunk
+
+    def abandon(self):
+        """Drop the rest of a job that will not be written (failed or timed out)."""
+        with self._cond:
+            self._abandoned = True
+            size = sum(len(chunk) for chunk in self._chunks)
+            self._chunks.clear()
+        if size:
+            self._budget.release(size)
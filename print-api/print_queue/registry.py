@@ -0,0 +1,102 @@
+"""Job lookup for status queries, bounded in time, count and memory.
+
+Queued and printing jobs are kept whole. When a job finishes, its
+payload (text, base64 images, raw bytes) is dropped and only a compact
+JobRecord with its state, error and metrics stays for status queries.
+Records expire oldest first from a deque ordered by completion time, so
+finishing a job costs O(1) amortized instead of a scan of every job.
+"""
+import time
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple, Union
+
+from .job import PrintJob
+
+# Rough per-record cost in bytes (slots object, dict entries, deque slot)
+_RECORD_OVERHEAD = 400
+
+
+class JobRecord:
+    """What remains of a finished job: same status fields as PrintJob, no payload."""
+
+    __slots__ = ('id', 'state', 'priority', 'error', 'metrics', 'client_ip',
+                 'created_at', 'started_at', 'completed_at')
+
+    def __init__(self, job: PrintJob):
+        self.id = job.id
+        self.state = job.state
+        self.priority = job.priority
+        self.error = job.error
+        self.metrics = job.metrics
+        self.client_ip = job.client_ip
+        self.created_at = job.created_at
+        self.started_at = job.started_at
+        self.completed_at = job.completed_at
+
+    def size(self) -> int:
+        return _RECORD_OVERHEAD + len(self.error or '') + len(repr(self.metrics))
+
+
+class JobRegistry:
+    """Active jobs plus a bounded history of finished ones.
+
+    A finished record is kept for at most `max_age` seconds, and the
+    oldest go early whenever there are more than `max_entries` or their
+    estimated size passes `max_bytes`.
+    """
+
+    def __init__(self, max_age: float = 300.0, max_entries: int = 10000, max_bytes: int = 8 * 1024 * 1024):
+        self._max_age = max_age
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._active: Dict[str, PrintJob] = {}
+        self._finished: Dict[str, JobRecord] = {}
+        # (completed_at, job id, record size), oldest first
+        self._expiry: Deque[Tuple[float, str, int]] = deque()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, job: PrintJob):
+        with self._lock:
+            self._active[job.id] = job
+
+    def discard(self, job_id: str):
+        """Forget a job that was never queued."""
+        with self._lock:
+            self._active.pop(job_id, None)
+
+    def finish(self, job: PrintJob):
+        """Replace a finished job with its compact record and expire old records."""
+        record = JobRecord(job)
+        size = record.size()
+        now = job.completed_at or time.monotonic()
+        with self._lock:
+            self._active.pop(job.id, None)
+            self._finished[job.id] = record
+            self._expiry.append((now, job.id, size))
+            self._bytes += size
+            self._expire(now)
+
+    def _expire(self, now: float):
+        expiry = self._expiry
+        while expiry and (
+            now - expiry[0][0] > self._max_age
+            or len(expiry) > self._max_entries
+            or self._bytes > self._max_bytes
+        ):
+            _, job_id, size = expiry.popleft()
+            self._finished.pop(job_id, None)
+            self._bytes -= size
+
+    def get(self, job_id: str) -> Optional[Union[PrintJob, JobRecord]]:
+        with self._lock:
+            return self._active.get(job_id) or self._finished.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "active": len(self._active),
+                "finished": len(self._finished),
+                "history_bytes": self._bytes,
+            }
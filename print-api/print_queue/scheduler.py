@@ -0,0 +1,118 @@
+"""Job scheduling: priority classes with fair queuing between clients.
+
+Every job belongs to a class (urgent, normal or bulk) and a client (its
+IP address). Classes are served in strict priority order and each has
+its own capacity, so a bulk run filling its class never makes urgent or
+normal submissions fail.
+
+Within a class, clients share the printer by weighted fair queuing: a
+job's tag is its client's previous tag plus 1/weight (weight 1 unless
+configured), but never less than the class's virtual time (the tag of
+the job last served). A client that sends 200 labels gets tags 1..200
+while a terminal sending one ticket gets tag 1, so the ticket prints
+after at most one label, not after all of them. Each client's own jobs
+keep their submission order. Put and get are O(log n) heap operations.
+"""
+import heapq
+import itertools
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from queue import Empty, Full
+
+from .job import PrintJob
+
+# Highest priority first
+PRIORITY_CLASSES = ('urgent', 'normal', 'bulk')
+
+
+class _Class:
+    __slots__ = ('capacity', 'client_capacity', 'heap', 'vtime', 'last_tag', 'queued')
+
+    def __init__(self, capacity: int, client_capacity: int):
+        self.capacity = capacity
+        self.client_capacity = client_capacity
+        self.heap: List[Tuple[float, int, PrintJob]] = []
+        self.vtime = 0.0
+        # Per-client tag of its newest queued job, and how many it has queued
+        self.last_tag: Dict[str, float] = {}
+        self.queued: Dict[str, int] = {}
+
+
+class FairQueue:
+    """Drop-in for the Queue used by JobQueue: put_nowait/get/qsize/task_done.
+
+    `capacities` maps each class to its maximum depth. A client may hold
+    at most `client_share` of a class's capacity (1.0 = no per-client limit).
+    `weights` gives some clients a larger share of the printer.
+    """
+
+    def __init__(
+        self,
+        capacities: Dict[str, int],
+        client_share: float = 1.0,
+        weights: Optional[Dict[str, float]] = None,
+    ):
+        self._weights = weights or {}
+        self._classes = {
+            name: _Class(capacities[name], max(1, int(capacities[name] * client_share)))
+            for name in PRIORITY_CLASSES
+        }
+        self._seq = itertools.count()
+        self._size = 0
+        self._cond = threading.Condition()
+
+    @staticmethod
+    def _client(job: PrintJob) -> str:
+        return job.client_ip or ''
+
+    def put_nowait(self, job: PrintJob, force: bool = False):
+        """Queue a job, or raise queue.Full if its class (or its client's
+        share of it) is full. `force` ignores capacity (journal replay)."""
+        cls = self._classes[job.priority]
+        client = self._client(job)
+        with self._cond:
+            queued = cls.queued.get(client, 0)
+            if not force and (len(cls.heap) >= cls.capacity or queued >= cls.client_capacity):
+                raise Full
+            tag = max(cls.vtime, cls.last_tag.get(client, 0.0)) + 1.0 / self._weights.get(client, 1.0)
+            cls.last_tag[client] = tag
+            cls.queued[client] = queued + 1
+            heapq.heappush(cls.heap, (tag, next(self._seq), job))
+            self._size += 1
+            self._cond.notify()
+
+    def get(self, timeout: Optional[float] = None) -> PrintJob:
+        """Next job: highest class first, smallest tag within it. Raises queue.Empty on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self._size:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise Empty
+                self._cond.wait(remaining)
+            for cls in self._classes.values():
+                if cls.heap:
+                    break
+            tag, _, job = heapq.heappop(cls.heap)
+            cls.vtime = tag
+            client = self._client(job)
+            cls.queued[client] -= 1
+            if not cls.queued[client]:
+                # Nothing queued: its next tag starts from the virtual time
+                del cls.queued[client]
+                del cls.last_tag[client]
+            self._size -= 1
+            return job
+
+    def qsize(self) -> int:
+        return self._size
+
+    def task_done(self):
+        pass
+
+    def depths(self) -> Dict[str, int]:
+        """Queued jobs per priority class."""
+        with self._cond:
+            return {name: len(cls.heap) for name, cls in self._classes.items()}
@@ -11,8 +11,11 @@ from flask import Flask, jsonify
 
 import config
 from api import register_blueprints
-from print_queue import JobQueue
+from print_queue import JobJournal, JobQueue, JobRegistry, MergeManager
 from driver.printer import PrinterDriver
+from driver.logos import LogoRegistry
+from driver.render_pool import RenderPool
+from driver.template_store import get_store as get_template_store
 
 
 def create_app() -> Flask:
@@ -37,23 +40,63 @@ def create_app() -> Flask:
             "flask-limiter not installed, rate limiting disabled"
         )
 
-    # Initialize printer driver
-    printer_driver = PrinterDriver(config.PRINTER_DEVICE, config.PRINTER_BACKEND)
+    # Initialize printer driver and NV logo store
+    logo_registry = LogoRegistry(config.LOGO_STORE_FILE, config.LOGO_NV_CAPACITY)
+    render_pool = None
+    if config.RENDER_WORKERS > 0:
+        render_pool = RenderPool(config.RENDER_WORKERS)
+        render_pool.warm()
+    printer_driver = PrinterDriver(
+        config.PRINTER_DEVICE, config.PRINTER_BACKEND, logos=logo_registry,
+        render_pool=render_pool,
+    )
+    # Detect the printer profile before any job is rendered ahead
+    printer_driver.connect()
+
+    # Compile all receipt templates now rather than on the first job
+    template_store = get_template_store()
+    template_store.start_watcher(config.TEMPLATE_RELOAD_INTERVAL)
 
-    # Initialize job queue
+    # Initialize job queue, replaying unfinished jobs from the journal
+    journal = JobJournal(config.JOB_JOURNAL_FILE) if config.JOB_JOURNAL_FILE else None
     job_queue = JobQueue(
         max_depth=config.QUEUE_MAX_DEPTH,
         job_timeout=config.JOB_TIMEOUT,
+        print_mode=config.PRINT_MODE,
+        # Keep every render worker busy
+        render_ahead=max(config.RENDER_AHEAD, config.RENDER_WORKERS),
+        render_buffer=config.RENDER_BUFFER_BYTES,
+        journal=journal,
+        class_depths={'urgent': config.QUEUE_URGENT_DEPTH, 'bulk': config.QUEUE_BULK_DEPTH},
+        client_share=config.QUEUE_CLIENT_SHARE,
+        client_weights=config.QUEUE_CLIENT_WEIGHTS,
+        registry=JobRegistry(
+            max_age=config.JOB_HISTORY_SECONDS,
+            max_entries=config.JOB_HISTORY_MAX_ENTRIES,
+            max_bytes=config.JOB_HISTORY_MAX_BYTES,
+        ),
+    )
+    pipelined = config.RENDER_AHEAD > 0 or render_pool is not None
+    job_queue.start(
+        printer_callback=printer_driver.print_job,
+        render_callback=printer_driver.render_job if pipelined else None,
     )
-    job_queue.start(printer_callback=printer_driver.print_job)
+    merge_manager = MergeManager(job_queue, inflight=config.MERGE_INFLIGHT)
 
     # Store on app.extensions for access in route handlers
     app.extensions['job_queue'] = job_queue
     app.extensions['printer_driver'] = printer_driver
+    app.extensions['logo_registry'] = logo_registry
+    app.extensions['template_store'] = template_store
+    app.extensions['merge_manager'] = merge_manager
 
     # Clean shutdown
+    atexit.register(merge_manager.stop)
     atexit.register(job_queue.stop)
     atexit.register(printer_driver.close)
+    atexit.register(template_store.stop)
+    if render_pool is not None:
+        atexit.register(render_pool.stop)
 
     # Register API blueprints (/api/v1/...)
     register_blueprints(app)
@@ -66,6 +109,7 @@ def create_app() -> Flask:
             "status": "healthy" if available else "degraded",
             "printer_device": config.PRINTER_DEVICE,
             "printer_connected": available,
+            "printer_profile": printer_driver.profile.name,
             "queue_depth": job_queue.depth,
             "timestamp": datetime.now(timezone.utc).isoformat(),
         }), 200 if available else 503
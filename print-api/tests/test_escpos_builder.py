@@ -0,0 +1,142 @@
+"""Payload to ESC/POS: hybrid text segmentation."""
+from driver.escpos_builder import _print_mode_commands, build_escpos_commands
+from driver.profiles import get_profile
+from driver.template_store import RASTER_MARK
+
+RASTER = b"\x1dv0"
+SELECT_CP437 = b"\x1C.\x1Bt\x00"
+ITEMS = {'items': [{'name': 'Café crème', 'price': '3.50'}], 'total': '3.50'}
+
+
+def _receipt(render_mode=None, font_style='montserrat'):
+    payload = {'template': 'receipt', 'template_data': ITEMS, 'font_style': font_style}
+    if render_mode:
+        payload['render_mode'] = render_mode
+    return build_escpos_commands(payload)
+
+
+def _hybrid_text(text, profile='default'):
+    return build_escpos_commands(
+        {'text': text, 'font_style': 'montserrat', 'render_mode': 'hybrid'},
+        profile=get_profile(profile))
+
+
+def test_hybrid_keeps_unmarked_lines_native():
+    data = _receipt('hybrid')
+    assert SELECT_CP437 in data
+    assert data.index(SELECT_CP437) < data.index(b"Caf\x82 cr\x8ame")
+    assert b"TOTAL" in data
+    # Header and rule are marked for the custom font
+    assert data.count(RASTER) >= 1
+    assert b"RECEIPT" not in data
+
+
+def test_raster_mode_is_default():
+    data = _receipt()
+    assert b"TOTAL" not in data
+    assert RASTER in data
+
+
+def test_marker_never_printed():
+    for mode in (None, 'hybrid'):
+        data = _receipt(mode, font_style='default')
+        assert RASTER_MARK.encode() not in data
+        assert b"RECEIPT\n" in data
+
+
+def test_hybrid_payload_text():
+    data = _hybrid_text('Line one\nLigne deux é')
+    assert data.count(SELECT_CP437) == 1
+    assert SELECT_CP437 + b"Line one\nLigne deux \x82\n" in data
+    assert RASTER not in data
+
+
+def test_hybrid_rasterizes_lines_outside_the_code_page():
+    data = _hybrid_text('Total\nZażółć 5€')
+    assert b"Total\n" in data
+    assert RASTER in data
+    assert b"Za?" not in data and b" 5?" not in data
+
+
+def test_hybrid_uses_the_profile_code_page():
+    data = _hybrid_text('Total 5€', 'epson-tm-t20')
+    assert b"\x1C.\x1Bt\x13Total 5\xd5\n" in data
+    assert RASTER not in data
+
+
+def test_native_qr_bytes():
+    data = build_escpos_commands({'qr_code': 'hi', 'cut': False})
+    assert (
+        b"\x1d(k\x04\x001A2\x00"      # model 2
+        b"\x1d(k\x03\x001C\x06"       # module size 6
+        b"\x1d(k\x03\x001E0"          # error correction L
+        b"\x1d(k\x05\x001P0hi"        # store data
+        b"\x1d(k\x03\x001Q0"          # print
+    ) in data
+
+
+def test_native_barcode_bytes():
+    data = build_escpos_commands({'barcode': {'type': 'EAN13', 'data': '4006381333931'}, 'cut': False})
+    assert b"\x1dh\x32\x1dw\x02\x1df\x00\x1dH\x02\x1dk\x43\x0d4006381333931" in data
+
+
+def test_code128_selects_code_set_b():
+    data = build_escpos_commands({'barcode': {'type': 'CODE128', 'data': 'AB-1'}, 'cut': False})
+    assert b"\x1dk\x49\x06{BAB-1" in data
+
+
+def test_raster_only_profile_renders_codes():
+    profile = get_profile('raster-only')
+    data = build_escpos_commands(
+        {'qr_code': 'hi', 'barcode': {'type': 'CODE39', 'data': 'AB1'}, 'cut': False},
+        profile=profile)
+    assert b"\x1d(k" not in data
+    assert b"\x1dk" not in data
+    assert b"\x1d(L" not in data
+    assert data.count(RASTER) >= 2
+
+
+def _raster_blocks(data):
+    """(width bytes, rows) of every GS v 0 block in `data`."""
+    blocks, at = [], data.find(RASTER)
+    while at >= 0:
+        head = data[at + 4:at + 8]
+        width, rows = head[0] | head[1] << 8, head[2] | head[3] << 8
+        blocks.append((width, rows))
+        at = data.find(RASTER, at + 8 + width * rows)
+    return blocks
+
+
+def test_raster_codes_fit_the_receive_buffer():
+    profile = get_profile('raster-only')
+    data = build_escpos_commands({'qr_code': 'x' * 170, 'cut': False}, profile=profile)
+    blocks = _raster_blocks(data)
+    assert len(blocks) >= 2
+    assert all(8 + width * rows <= profile.receive_buffer for width, rows in blocks)
+
+
+PRINT_CONTROL = b"\x1d(K\x02\x00"
+
+
+def test_print_mode_bytes_per_profile():
+    assert _print_mode_commands('draft', get_profile('epson-tm-t20')) == (
+        PRINT_CONTROL + b"\x32\x09" + PRINT_CONTROL + b"\x31\xfe",
+        PRINT_CONTROL + b"\x32\x00" + PRINT_CONTROL + b"\x31\x00",
+    )
+    assert _print_mode_commands('dense', get_profile('epson-tm-t88')) == (
+        PRINT_CONTROL + b"\x32\x01" + PRINT_CONTROL + b"\x31\x03",
+        PRINT_CONTROL + b"\x32\x00" + PRINT_CONTROL + b"\x31\x00",
+    )
+    assert _print_mode_commands('draft', get_profile('epson-tm-t88'))[0].startswith(
+        PRINT_CONTROL + b"\x32\x0d")
+    assert _print_mode_commands('normal', get_profile('epson-tm-t20')) == (b"", b"")
+    # Printers without GS ( K get nothing
+    assert _print_mode_commands('dense', get_profile('default')) == (b"", b"")
+
+
+def test_print_mode_is_restored_before_the_cut():
+    profile = get_profile('epson-tm-m30')
+    enter, restore = _print_mode_commands('draft', profile)
+    data = build_escpos_commands({'text': 'x', 'print_mode': 'draft'}, profile=profile)
+    assert data.startswith(b"\x1b@" + enter)
+    assert data.index(restore) < data.index(b"\x1dV\x00")
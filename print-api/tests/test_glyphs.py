@@ -0,0 +1,30 @@
+"""Glyph atlas: packed storage, eviction and font keys."""
+import numpy as np
+import pytest
+
+from driver import renderer
+from driver.glyphs import GlyphAtlas
+
+
+def test_atlas_stores_packed_glyphs():
+    font = renderer._get_font('montserrat', False, 48)
+    atlas = GlyphAtlas(1 << 20)
+    glyph = atlas.get(('f', 48), font, 'W')
+    assert glyph.rows.dtype == np.uint8
+    assert glyph.rows.shape == (glyph.height, (glyph.width + 7) // 8)
+    assert glyph.bitmap.shape == (glyph.height, glyph.width)
+    assert glyph.bitmap.any()
+
+
+def test_atlas_evicts_to_budget():
+    font = renderer._get_font('montserrat', False, 72)
+    atlas = GlyphAtlas(2048)
+    for ch in "ABCDEFGHIJKLMNOP":
+        atlas.get(('f', 72), font, ch)
+    assert atlas.size_bytes <= 2048 or len(atlas) == 1
+
+
+@pytest.mark.parametrize('bold', [False, True])
+def test_kings_styles_share_atlas_key(bold):
+    assert renderer._font_key('kings', bold, 24) == renderer._font_key('kings', False, 24)
+    assert renderer._font_key('montserrat', True, 24) != renderer._font_key('montserrat', False, 24)
@@ -0,0 +1,56 @@
+"""JobJournal: unfinished jobs survive a restart."""
+import pytest
+
+from print_queue.job import PrintJob
+from print_queue.journal import JobJournal
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'jobs.db')
+
+
+def test_replays_unfinished_jobs_in_order(path):
+    journal = JobJournal(path)
+    jobs = [PrintJob(id=f'j{n}', payload={'text': f'job {n}'}, client_ip='10.0.0.1') for n in range(4)]
+    for job in jobs:
+        journal.submitted(job)
+    journal.started(jobs[0])
+    journal.finished(jobs[0])
+    journal.started(jobs[2])
+    journal.close()
+
+    replayed = JobJournal(path).unfinished()
+    assert [job.id for job in replayed] == ['j1', 'j2', 'j3']
+    assert replayed[0].payload == {'text': 'job 1'}
+    assert replayed[0].client_ip == '10.0.0.1'
+    assert all(job.metrics['replayed'] for job in replayed)
+
+
+def test_raw_and_priority_round_trip(path):
+    journal = JobJournal(path)
+    journal.submitted(PrintJob(id='raw', payload={'raw_data': b'\x1b@\x00\xff'},
+                               is_raw=True, priority='urgent'))
+    journal.close()
+
+    [job] = JobJournal(path).unfinished()
+    assert job.is_raw
+    assert job.payload['raw_data'] == b'\x1b@\x00\xff'
+    assert job.priority == 'urgent'
+
+
+def test_group_commit(path):
+    journal = JobJournal(path)
+    for n in range(200):
+        journal.submitted(PrintJob(id=str(n), payload={}))
+    journal.close()
+    assert journal.records == 200
+    assert journal.commits <= 200
+    assert len(JobJournal(path).unfinished()) == 200
+
+
+def test_closed_journal_ignores_records(path):
+    journal = JobJournal(path)
+    journal.close()
+    journal.submitted(PrintJob(id='late', payload={}))
+    assert JobJournal(path).unfinished() == []
@@ -0,0 +1,77 @@
+"""Structured layout: column widths and compiled ESC/POS lines."""
+from driver.layout import column_widths, compile_lines
+from driver.profiles import get_profile
+
+PROFILE = get_profile('default')  # 512 dots: 42 columns in font A
+
+
+def _body(data, profile=PROFILE):
+    """Printable text of compiled output, one entry per line."""
+    prefix = profile.code_page_command()
+    assert data.startswith(prefix)
+    data = data[len(prefix):]
+    lines = []
+    for line in data.split(b"\n")[:-1]:
+        while line[:1] == b"\x1B":
+            line = line[3:]
+        lines.append(line.decode(profile.code_page))
+    return lines
+
+
+def test_column_widths_flexible_share():
+    assert column_widths([None, 7], 42) == [34, 7]
+    assert column_widths([None, None], 42) == [21, 20]
+
+
+def test_column_widths_shrink_to_fit():
+    widths = column_widths([30, 30], 42)
+    assert sum(widths) + 1 <= 42
+    assert all(w >= 1 for w in widths)
+
+
+def test_row_columns_align():
+    data = compile_lines([
+        {'type': 'row', 'columns': [{'text': 'Coffee'}, {'text': '3.50', 'width': 7, 'align': 'right'}]},
+        {'type': 'row', 'columns': [{'text': 'Bagel'}, {'text': '12.00', 'width': 7, 'align': 'right'}]},
+    ], PROFILE)
+    lines = _body(data)
+    assert lines == ['Coffee'.ljust(34) + ' ' + '   3.50', 'Bagel'.ljust(34) + ' ' + '  12.00']
+
+
+def test_row_wraps_long_cell():
+    data = compile_lines([
+        {'type': 'row', 'columns': [{'text': 'word ' * 10}, {'text': '1.00', 'width': 5, 'align': 'right'}]},
+    ], PROFILE)
+    lines = _body(data)
+    assert len(lines) == 2
+    assert lines[0].endswith(' 1.00')
+    assert all(len(line) <= 42 for line in lines)
+
+
+def test_separator_and_wide_size():
+    assert _body(compile_lines([{'type': 'separator', 'char': '='}], PROFILE)) == ['=' * 42]
+    wide = compile_lines([{'type': 'separator', 'size': 'wide'}], PROFILE)
+    assert _body(wide) == ['-' * 21]
+    assert b"\x1B!\x20" in wide
+
+
+def test_total_is_bold_and_right_aligned():
+    data = compile_lines([{'type': 'total', 'label': 'TOTAL', 'value': '5.50'}], PROFILE)
+    assert b"\x1B!\x08" in data
+    assert _body(data) == ['TOTAL'.ljust(37) + ' 5.50']
+
+
+def test_selects_the_profile_code_page():
+    data = compile_lines([{'type': 'text', 'text': 'Café €'}], PROFILE)
+    assert data.startswith(b"\x1C.\x1Bt\x00")
+    assert 'Café ?' in _body(data)[0]
+
+    epson = get_profile('epson-tm-t20')
+    data = compile_lines([{'type': 'text', 'text': 'Café €'}], epson)
+    assert data.startswith(b"\x1C.\x1Bt\x13")
+    assert 'Café €' in _body(data, epson)[0]
+
+
+def test_restores_defaults():
+    data = compile_lines([{'type': 'feed', 'lines': 2}], PROFILE, font='B')
+    assert data == b"\x1C.\x1Bt\x00\n\n\x1Ba\x00\x1B!\x00"
@@ -0,0 +1,64 @@
+"""LogoRegistry sync bookkeeping and the NV key list reply."""
+import pytest
+from PIL import Image
+
+from driver.logos import LogoRegistry, parse_key_list
+
+BLACK = Image.new('1', (16, 8), 0)
+WHITE = Image.new('1', (16, 8), 1)
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return LogoRegistry(str(tmp_path / 'logos.json'), 64 * 1024)
+
+
+def _pending_keys(registry):
+    return [key for key, _ in registry.pending_commands()[1]]
+
+
+def test_sync_marks_only_what_was_sent(registry):
+    registry.register('AA', BLACK)
+    registry.register('BB', BLACK)
+    commands, batch = registry.pending_commands()
+    assert commands
+
+    # Changed while the batch was being written
+    registry.register('AA', WHITE)
+    registry.remove('BB')
+    registry.register('CC', BLACK)
+    registry.mark_synced(batch)
+
+    assert _pending_keys(registry) == ['BB', 'AA', 'CC']
+    registry.mark_synced(registry.pending_commands()[1])
+    assert registry.pending_commands() == (b"", [])
+
+
+def test_unchanged_logo_is_not_rewritten(registry):
+    registry.register('AA', BLACK)
+    registry.mark_synced(registry.pending_commands()[1])
+    registry.register('AA', BLACK)
+    assert _pending_keys(registry) == []
+
+
+def test_mark_missing(registry):
+    registry.register('AA', BLACK)
+    registry.register('BB', BLACK)
+    registry.mark_synced(registry.pending_commands()[1])
+    registry.mark_missing({'AA'})
+    assert _pending_keys(registry) == ['BB']
+
+
+def test_manifest_survives_restart(registry, tmp_path):
+    registry.register('AA', BLACK)
+    registry.mark_synced(registry.pending_commands()[1])
+    reloaded = LogoRegistry(str(tmp_path / 'logos.json'), 64 * 1024)
+    assert reloaded.status()['logos'][0]['synced']
+
+
+def test_parse_key_list():
+    assert parse_key_list(b"\x37\x70\x40AAB1\x00") == ({'AA', 'B1'}, False)
+    assert parse_key_list(b"\x37\x70\x41AA\x00") == ({'AA'}, True)
+    assert parse_key_list(b"\x37\x70\x40\x00") == (set(), False)
+    assert parse_key_list(b"") is None
+    assert parse_key_list(b"\x37\x70\x40A\x00") is None
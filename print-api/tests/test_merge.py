@@ -0,0 +1,67 @@
+"""Mail merge: row parsing and per-row failure reporting."""
+import io
+import time
+
+from print_queue.manager import JobQueue
+from print_queue.merge import MAX_REPORTED_FAILURES, MergeManager, MergeRun, MergeState, iter_rows
+
+
+def _rows(body, fmt):
+    return list(iter_rows(io.BytesIO(body.encode()), fmt))
+
+
+def test_jsonl_rows():
+    rows = _rows('{"n": 1}\n\nnot json\n[1, 2]\n{"n": "é"}\n', 'jsonl')
+    assert [(number, data) for number, data, _ in rows] == [
+        (1, {'n': 1}), (2, None), (3, None), (4, {'n': 'é'})]
+    assert rows[1][2].startswith("Invalid JSON")
+    assert rows[2][2] == "Row must be a JSON object"
+
+
+def test_csv_rows_are_numbered_after_the_header():
+    rows = _rows('name,price\nTea,2.00\nCake,3.50,extra\n"Café, latte",4\n', 'csv')
+    assert rows[0] == (1, {'name': 'Tea', 'price': '2.00'}, None)
+    assert rows[1] == (2, None, "More fields than header columns")
+    assert rows[2] == (3, {'name': 'Café, latte', 'price': '4'}, None)
+
+
+def test_reported_failures_are_capped():
+    run = MergeRun(template='receipt', fmt='jsonl', options={})
+    for number in range(MAX_REPORTED_FAILURES + 5):
+        run.fail_row(number, "bad")
+    assert run.rows_failed == MAX_REPORTED_FAILURES + 5
+    assert len(run.failures) == MAX_REPORTED_FAILURES
+
+
+def _print(job):
+    name = job.payload['template_data']['name']
+    if name == 'jam':
+        raise RuntimeError("Paper out")
+    if name == 'typo':
+        job.metrics['template_error'] = "'price' is undefined"
+
+
+def test_run_reports_failed_rows():
+    queue = JobQueue()
+    queue.start(_print)
+    manager = MergeManager(queue)
+    body = "\n".join([
+        '{"name": "ok"}', '{"name": "jam"}', 'oops', '{"name": "typo"}', '{"name": "ok"}',
+    ])
+    try:
+        run = manager.start('receipt', 'jsonl', io.BytesIO(body.encode()), {'cut': False})
+        deadline = time.monotonic() + 5
+        while run.state == MergeState.RUNNING:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+    finally:
+        queue.stop()
+
+    assert run.state == MergeState.DONE
+    assert (run.rows_read, run.rows_printed, run.rows_failed) == (5, 2, 3)
+    errors = {failure['row']: failure['error'] for failure in run.failures}
+    assert sorted(errors) == [2, 3, 4]
+    assert errors[2] == "Paper out"
+    assert errors[3].startswith("Invalid JSON")
+    assert errors[4] == "Template error: 'price' is undefined"
+    assert manager.get(run.id).to_dict()['rows_failed'] == 3
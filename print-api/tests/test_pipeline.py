@@ -0,0 +1,112 @@
+"""Pipelined printing: chunk pipes, the byte budget and JobQueue order."""
+import threading
+import time
+
+import pytest
+
+from print_queue.job import JobState, PrintJob
+from print_queue.manager import JobQueue
+from print_queue.pipeline import ByteBudget, ChunkPipe
+
+
+def test_pipe_yields_chunks_in_order():
+    budget = ByteBudget(1024)
+    pipe = ChunkPipe(budget)
+    for chunk in (b"a", b"bb", b"ccc"):
+        assert pipe.put(chunk)
+    pipe.close()
+    assert list(pipe) == [b"a", b"bb", b"ccc"]
+    assert budget.used == 0
+
+
+def test_render_error_reaches_the_writer_after_its_chunks():
+    pipe = ChunkPipe(ByteBudget(1024))
+    pipe.put(b"init")
+    pipe.close(ValueError("bad template"))
+    chunks = iter(pipe)
+    assert next(chunks) == b"init"
+    with pytest.raises(ValueError, match="bad template"):
+        next(chunks)
+
+
+def test_budget_blocks_until_the_writer_catches_up():
+    budget = ByteBudget(4)
+    pipe = ChunkPipe(budget)
+    pipe.put(b"1234")
+    done = threading.Event()
+    threading.Thread(target=lambda: (pipe.put(b"5"), done.set()), daemon=True).start()
+    assert not done.wait(0.1)
+    assert next(iter(pipe)) == b"1234"
+    assert done.wait(1.0)
+
+
+def test_oversized_chunk_passes_an_empty_budget():
+    budget = ByteBudget(4)
+    assert ChunkPipe(budget).put(b"x" * 100)
+    assert budget.used == 100
+
+
+def test_abandon_releases_the_budget_and_refuses_chunks():
+    budget = ByteBudget(1024)
+    pipe = ChunkPipe(budget)
+    pipe.put(b"abc")
+    pipe.abandon()
+    assert budget.used == 0
+    assert not pipe.put(b"def")
+    assert budget.used == 0
+
+
+def _run(queue, jobs, timeout=5.0):
+    """Submit `jobs` and wait until every one has finished."""
+    for job in jobs:
+        assert queue.submit(job)
+    deadline = time.monotonic() + timeout
+    while any(job.state in (JobState.QUEUED, JobState.PRINTING) for job in jobs):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_pipelined_jobs_print_in_submission_order():
+    printed = []
+    queue = JobQueue(render_ahead=2)
+    queue.start(
+        lambda job, chunks: printed.append(b"".join(chunks)),
+        lambda job: iter([job.id.encode(), b"."]),
+    )
+    try:
+        _run(queue, [PrintJob(id=f"job{n}", client_ip='a') for n in range(5)])
+    finally:
+        queue.stop()
+    assert printed == [f"job{n}.".encode() for n in range(5)]
+
+
+def test_timed_out_job_is_abandoned_and_the_next_prints():
+    release = threading.Event()
+    rendered = []
+    printed = []
+
+    def _render(job):
+        for n in range(1000):
+            rendered.append(job.id)
+            yield b"x" * 64
+
+    def _print(job, chunks):
+        if job.id == 'stuck':
+            release.wait()
+            return
+        printed.append(len(b"".join(chunks)))
+
+    queue = JobQueue(job_timeout=0.2, render_ahead=1, render_buffer=256)
+    queue.start(_print, _render)
+    stuck, after = PrintJob(id='stuck', client_ip='a'), PrintJob(id='after', client_ip='a')
+    try:
+        _run(queue, [stuck, after])
+    finally:
+        release.set()
+        queue.stop()
+    assert stuck.state == JobState.ERROR
+    assert "timed out" in stuck.error
+    # Rendering stopped once the stuck job was given up on
+    assert rendered.count('stuck') < 1000
+    assert after.state == JobState.DONE
+    assert printed == [64 * 1000]
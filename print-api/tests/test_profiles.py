@@ -0,0 +1,17 @@
+"""Printer profiles: print area and resolution."""
+import pytest
+
+from driver.profiles import PROFILES, get_profile
+from driver.raster import MM_PER_INCH
+
+
+@pytest.mark.parametrize('name', sorted(PROFILES))
+def test_print_area_fits_the_paper(name):
+    profile = PROFILES[name]
+    assert profile.dot_width / profile.dpi * MM_PER_INCH <= 72.3
+
+
+def test_tm_t88_is_180_dpi():
+    profile = get_profile('epson-tm-t88')
+    assert (profile.dot_width, profile.dpi, profile.motion_units) == (512, 180, 360)
+    assert profile.columns() == 42
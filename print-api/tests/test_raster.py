@@ -0,0 +1,118 @@
+"""Raster encoding: parity with python-escpos, blank-row trimming."""
+import numpy as np
+import pytest
+from escpos.printer import Dummy
+from PIL import Image
+
+from driver.raster import (
+    FRAGMENT_HEIGHT, BlankRowTrimmer, encode_column, encode_feed, encode_packed, encode_raster,
+)
+
+
+def _dummy_image(img, impl='bitImageRaster'):
+    dummy = Dummy()
+    dummy.image(img, impl=impl)
+    return dummy.output
+
+
+SAMPLES = {
+    'two-tone': Image.fromarray(np.where(np.indices((60, 100)).sum(axis=0) % 7 < 3, 0, 255).astype(np.uint8)),
+    'odd width': Image.new('L', (37, 20), 0),
+    'gray': Image.fromarray(np.random.default_rng(0).integers(0, 256, (40, 64), dtype=np.uint8)).convert('RGB'),
+    'transparent': Image.new('RGBA', (24, 24), (0, 0, 0, 128)),
+    'mode 1': Image.new('1', (33, 9), 0),
+    'taller than a fragment': Image.new('L', (16, FRAGMENT_HEIGHT + 50), 0),
+}
+
+
+@pytest.mark.parametrize('name', SAMPLES)
+def test_raster_matches_dummy(name):
+    assert encode_raster(SAMPLES[name]) == _dummy_image(SAMPLES[name])
+
+
+@pytest.mark.parametrize('name', ['two-tone', 'odd width', 'gray', 'mode 1'])
+def test_column_matches_dummy(name):
+    assert encode_column(SAMPLES[name]) == _dummy_image(SAMPLES[name], impl='bitImageColumn')
+
+
+def _band(*rows):
+    """Packed band with ink on the given rows (False = blank)."""
+    band = np.zeros((len(rows), 8), dtype=np.uint8)
+    band[np.array(rows, dtype=bool)] = 0xFF
+    return band
+
+
+def test_crops_leading_and_trailing_blank_rows():
+    trimmer = BlankRowTrimmer()
+    data = trimmer.encode(_band(0, 0, 0, 1, 1, 0, 0))
+    trimmer.finish()
+    assert data == encode_packed(np.full((2, 8), 0xFF, dtype=np.uint8))
+    assert trimmer.rows_cropped == 5
+    assert trimmer.rows_fed == 0
+
+
+def test_long_gap_becomes_a_feed():
+    gap = 100
+    trimmer = BlankRowTrimmer()
+    data = trimmer.encode(_band(1, *[0] * gap, 1))
+    ink = encode_packed(np.full((1, 8), 0xFF, dtype=np.uint8))
+    assert data == ink + encode_feed(gap) + ink
+    assert trimmer.rows_fed == gap
+
+
+def test_short_gap_stays_raster():
+    trimmer = BlankRowTrimmer()
+    data = trimmer.encode(_band(1, 0, 1))
+    # The blank row is cheaper as raster: it pads the next block
+    assert data == encode_packed(_band(1)) + encode_packed(_band(0, 1))
+    assert trimmer.rows_fed == 0
+
+
+def test_gap_spanning_bands():
+    trimmer = BlankRowTrimmer()
+    first = trimmer.encode(_band(1, *[0] * 60))
+    second = trimmer.encode(_band(*[0] * 60, 1))
+    assert first == encode_packed(np.full((1, 8), 0xFF, dtype=np.uint8))
+    assert second.startswith(encode_feed(120))
+    assert trimmer.rows_fed == 120
+
+
+def test_no_blank_rows_saves_nothing():
+    band = np.full((200, 72), 0xFF, dtype=np.uint8)
+    trimmer = BlankRowTrimmer(max_rows=56)
+    assert trimmer.encode(band) == encode_packed(band, 56)
+    assert trimmer.bytes_saved == 0
+
+
+def test_savings_count_dropped_rows():
+    trimmer = BlankRowTrimmer(max_rows=56)
+    band = np.zeros((300, 72), dtype=np.uint8)
+    band[:10] = 0xFF
+    trimmer.encode(band)
+    trimmer.finish()
+    assert trimmer.bytes_saved == len(encode_packed(band, 56)) - len(encode_packed(band[:10], 56))
+
+
+def test_feed_follows_the_motion_unit():
+    assert encode_feed(100) == b"\x1bJ\x64"
+    # 180 dpi head with 1/360 inch motion units: two units per dot row
+    assert encode_feed(100, dpi=180, motion_units=360) == b"\x1bJ\xc8"
+    assert encode_feed(200, dpi=180, motion_units=360) == b"\x1bJ\xff\x1bJ\x91"
+
+
+def test_trimmer_feeds_in_the_printer_units():
+    trimmer = BlankRowTrimmer(dpi=180, motion_units=360)
+    data = trimmer.encode(_band(1, *[0] * 100, 1))
+    assert b"\x1bJ\xc8" in data
+    assert trimmer.rows_fed == 100
+
+
+def test_print_time_scales_with_resolution():
+    saved = {}
+    for dpi in (180, 203):
+        trimmer = BlankRowTrimmer(dpi=dpi, motion_units=dpi)
+        trimmer.encode(_band(0, 0, 1))
+        trimmer.finish()
+        saved[dpi] = trimmer.print_ms_saved
+    # A cropped row is taller, so slower to print, at the lower resolution
+    assert saved[180] == pytest.approx(saved[203] * 203 / 180)
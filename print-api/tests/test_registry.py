@@ -0,0 +1,63 @@
+"""JobRegistry: compact records and bounded history."""
+from print_queue.job import JobState, PrintJob
+from print_queue.registry import JobRecord, JobRegistry
+
+
+def _finish(registry, job_id, completed_at, error=None):
+    job = PrintJob(id=job_id, payload={'text': 'x' * 1000}, state=JobState.DONE,
+                   completed_at=completed_at, error=error)
+    registry.add(job)
+    registry.finish(job)
+    return job
+
+
+def test_active_job_is_kept_whole():
+    registry = JobRegistry()
+    job = PrintJob(id='a', payload={'text': 'hi'})
+    registry.add(job)
+    assert registry.get('a') is job
+
+
+def test_finished_job_keeps_status_not_payload():
+    registry = JobRegistry()
+    _finish(registry, 'a', 10.0, error='paper out')
+    record = registry.get('a')
+    assert isinstance(record, JobRecord)
+    assert record.state is JobState.DONE
+    assert record.error == 'paper out'
+    assert not hasattr(record, 'payload')
+    assert registry.stats()['active'] == 0
+
+
+def test_expires_by_age():
+    registry = JobRegistry(max_age=60)
+    _finish(registry, 'old', 1.0)
+    _finish(registry, 'new', 50.0)
+    _finish(registry, 'newest', 62.0)
+    assert registry.get('old') is None
+    assert registry.get('new') is not None
+
+
+def test_expires_by_count():
+    registry = JobRegistry(max_entries=3)
+    for n in range(5):
+        _finish(registry, str(n), float(n + 1))
+    assert [registry.get(str(n)) is not None for n in range(5)] == [False, False, True, True, True]
+    assert registry.stats()['finished'] == 3
+
+
+def test_expires_by_size():
+    registry = JobRegistry(max_bytes=2000)
+    for n in range(10):
+        _finish(registry, str(n), float(n + 1), error='e' * 200)
+    stats = registry.stats()
+    assert stats['history_bytes'] <= 2000
+    assert registry.get('9') is not None
+    assert registry.get('0') is None
+
+
+def test_discard():
+    registry = JobRegistry()
+    registry.add(PrintJob(id='a'))
+    registry.discard('a')
+    assert registry.get('a') is None
@@ -0,0 +1,39 @@
+"""Render pool worker: template refresh rate."""
+from driver import render_pool
+
+
+class _Store:
+    def __init__(self):
+        self.refreshes = 0
+
+    def refresh(self):
+        self.refreshes += 1
+        return 0
+
+
+def test_worker_refreshes_templates_once_per_interval(monkeypatch):
+    store, clock = _Store(), [1000.0]
+    monkeypatch.setattr(render_pool, 'get_template_store', lambda: store)
+    monkeypatch.setattr(render_pool.time, 'monotonic', lambda: clock[0])
+    monkeypatch.setattr(render_pool.config, 'TEMPLATE_RELOAD_INTERVAL', 2.0)
+    monkeypatch.setattr(render_pool, '_last_refresh', 0.0)
+
+    for _ in range(50):
+        render_pool._refresh_templates()
+    assert store.refreshes == 1
+
+    clock[0] += 1.9
+    render_pool._refresh_templates()
+    assert store.refreshes == 1
+    clock[0] += 0.1
+    render_pool._refresh_templates()
+    assert store.refreshes == 2
+
+
+def test_zero_interval_disables_refresh(monkeypatch):
+    store = _Store()
+    monkeypatch.setattr(render_pool, 'get_template_store', lambda: store)
+    monkeypatch.setattr(render_pool.config, 'TEMPLATE_RELOAD_INTERVAL', 0)
+    monkeypatch.setattr(render_pool, '_last_refresh', 0.0)
+    render_pool._refresh_templates()
+    assert store.refreshes == 0
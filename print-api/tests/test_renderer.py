@@ -0,0 +1,57 @@
+"""Renderer: packed output and bounded peak memory."""
+import tracemalloc
+
+import numpy as np
+
+from driver import renderer
+
+LINE = "Item {:04d} ........................ 12.50"
+
+
+def _peak(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_image_matches_raster():
+    text = "Hello\nWorld"
+    page = renderer.render_text_to_raster(text, width=384)
+    img = renderer.render_text_to_image(text, width=384)
+    assert img.mode == '1'
+    assert img.size == (384, page.shape[0])
+    dots = ~np.asarray(img)
+    assert np.array_equal(np.packbits(dots, axis=1), page)
+
+
+def test_page_memory_is_one_bit_per_dot():
+    text = "\n".join(LINE.format(i) for i in range(1000))
+    page = renderer.render_text_to_raster(text, width=512)
+    peak = _peak(lambda: renderer.render_text_to_raster(text, width=512))
+    # Bands plus their concatenation; an RGB canvas alone would be 24x
+    assert peak < 4 * page.nbytes
+
+
+def _consume(lines):
+    for _ in renderer.iter_text_bands(iter(lines), width=512, band_rows=256):
+        pass
+
+
+def test_bands_match_whole_page():
+    text = "\n".join(LINE.format(i) for i in range(50))
+    bands = list(renderer.iter_text_bands(text, width=512, band_rows=64))
+    assert all(len(band) <= 64 for band in bands[:-1])
+    assert np.array_equal(np.concatenate(bands), renderer.render_text_to_raster(text, width=512))
+
+
+def test_band_memory_does_not_grow_with_length():
+    short = [LINE.format(i) for i in range(200)]
+    long = [LINE.format(i) for i in range(2000)]
+    _consume(short + long)  # warm glyph atlas and wrap cache
+
+    peak_short = _peak(lambda: _consume(short))
+    peak_long = _peak(lambda: _consume(long))
+    assert peak_long < peak_short * 1.5 + 64 * 1024
@@ -0,0 +1,84 @@
+"""FairQueue: priority classes, fair tags and capacities."""
+from queue import Empty, Full
+
+import pytest
+
+from print_queue.job import PrintJob
+from print_queue.scheduler import FairQueue
+
+CAPACITIES = {'urgent': 5, 'normal': 10, 'bulk': 10}
+
+
+def _job(client, priority='normal', name=None):
+    return PrintJob(id=name or client, client_ip=client, priority=priority)
+
+
+def _drain(queue):
+    return [queue.get(timeout=0).id for _ in range(queue.qsize())]
+
+
+def test_classes_in_priority_order():
+    queue = FairQueue(CAPACITIES)
+    queue.put_nowait(_job('a', 'bulk', 'bulk'))
+    queue.put_nowait(_job('a', 'normal', 'normal'))
+    queue.put_nowait(_job('a', 'urgent', 'urgent'))
+    assert _drain(queue) == ['urgent', 'normal', 'bulk']
+
+
+def test_clients_interleave_and_keep_their_order():
+    queue = FairQueue(CAPACITIES)
+    for n in range(4):
+        queue.put_nowait(_job('labels', name=f'L{n}'))
+    queue.put_nowait(_job('terminal', name='T0'))
+    assert _drain(queue) == ['L0', 'T0', 'L1', 'L2', 'L3']
+
+
+def test_late_client_starts_at_virtual_time():
+    queue = FairQueue(CAPACITIES)
+    for n in range(4):
+        queue.put_nowait(_job('labels', name=f'L{n}'))
+    assert queue.get(timeout=0).id == 'L0'
+    assert queue.get(timeout=0).id == 'L1'
+    queue.put_nowait(_job('terminal', name='T0'))
+    # Tied with the next label, not queued behind all of them
+    assert _drain(queue) == ['L2', 'T0', 'L3']
+
+
+def test_weights():
+    queue = FairQueue(CAPACITIES, weights={'big': 2.0})
+    for n in range(4):
+        queue.put_nowait(_job('big', name=f'B{n}'))
+        queue.put_nowait(_job('small', name=f'S{n}'))
+    assert _drain(queue)[:6] == ['B0', 'S0', 'B1', 'B2', 'S1', 'B3']
+
+
+def test_full_class_does_not_block_others():
+    queue = FairQueue(CAPACITIES)
+    for n in range(10):
+        queue.put_nowait(_job(f'c{n}', 'bulk'))
+    with pytest.raises(Full):
+        queue.put_nowait(_job('x', 'bulk'))
+    queue.put_nowait(_job('x', 'urgent'))
+    queue.put_nowait(_job('x', 'normal'))
+    assert queue.depths() == {'urgent': 1, 'normal': 1, 'bulk': 10}
+
+
+def test_client_share():
+    queue = FairQueue(CAPACITIES, client_share=0.5)
+    for _ in range(5):
+        queue.put_nowait(_job('greedy'))
+    with pytest.raises(Full):
+        queue.put_nowait(_job('greedy'))
+    queue.put_nowait(_job('other'))
+
+
+def test_force_ignores_capacity():
+    queue = FairQueue({'urgent': 1, 'normal': 1, 'bulk': 1})
+    queue.put_nowait(_job('a'))
+    queue.put_nowait(_job('a'), force=True)
+    assert queue.qsize() == 2
+
+
+def test_get_timeout():
+    with pytest.raises(Empty):
+        FairQueue(CAPACITIES).get(timeout=0.01)
@@ -0,0 +1,52 @@
+"""Template static lines and the pre-rasterized fragment cache."""
+import pytest
+from jinja2 import Environment
+
+from driver import renderer
+from driver.escpos_builder import build_escpos_commands
+from driver.template_store import RASTER_MARK, find_static_lines, get_store, mark_raster
+
+RULE = "=" * 32
+ITEMS = {'items': [{'name': 'Bagel', 'price': '2.00'}], 'total': '2.00'}
+
+
+@pytest.fixture
+def env():
+    env = Environment()
+    env.filters['raster'] = mark_raster
+    return env
+
+
+def test_static_lines(env):
+    source = (
+        "Fixed\n{{ name }}\n{{ '-' * 4 }}\n"
+        "{% for x in items %}{{ x }}\n{% endfor %}\n"
+        "mixed {{ name }}\n{{ ('=' * 3) | raster }}\n"
+    )
+    assert find_static_lines(env, source) == {'Fixed', '----', '==='}
+
+
+def test_static_lines_are_unmarked():
+    lines = get_store().render_stream('receipt', ITEMS).static_lines
+    assert RULE in lines
+    assert not any(line.startswith(RASTER_MARK) for line in lines)
+
+
+@pytest.mark.parametrize('render_mode', ['raster', 'hybrid'])
+def test_rule_comes_from_fragments(monkeypatch, render_mode):
+    payload = {'template': 'receipt', 'template_data': ITEMS,
+               'font_style': 'montserrat', 'render_mode': render_mode}
+    renderer._fragments.clear()
+    first = build_escpos_commands(payload)
+    assert any(key[3] == RULE for key in renderer._fragments)
+
+    rasterized = []
+    line_strip = renderer._atlas.line_strip
+
+    def _line_strip(width, font_key, font, text, x):
+        rasterized.append(text)
+        return line_strip(width, font_key, font, text, x)
+
+    monkeypatch.setattr(renderer._atlas, 'line_strip', _line_strip)
+    assert build_escpos_commands(payload) == first
+    assert RULE not in rasterized
@@ -0,0 +1,39 @@
+"""Print request validation."""
+import pytest
+
+from api.v1.validation import ALLOWED_DITHER_MODES, validate_print_request
+from driver.dither import DITHER_MODES
+
+
+@pytest.mark.parametrize('barcode', [
+    {'type': 'EAN13', 'data': '4006381333931'},
+    {'type': 'EAN8', 'data': '9638507'},
+    {'type': 'UPC-A', 'data': '03600029145'},
+    {'type': 'CODE39', 'data': 'ABC-123'},
+    {'type': 'CODE128', 'data': 'Order #42'},
+])
+def test_valid_barcodes(barcode):
+    cleaned, errors = validate_print_request({'barcode': barcode, 'text': 'x'})
+    assert errors == []
+    assert cleaned['barcode'] == barcode
+
+
+@pytest.mark.parametrize('barcode', [
+    {'type': 'EAN13', 'data': 'ABCDEF'},
+    {'type': 'EAN13', 'data': '123'},
+    {'type': 'CODE39', 'data': 'lower case'},
+    {'type': 'CODE39', 'data': 'A' * 300},
+    {'type': 'CODE128', 'data': 'A' * 254},
+    {'type': 'CODE128', 'data': 'café'},
+    {'type': 'QR', 'data': '1'},
+])
+def test_invalid_barcodes(barcode):
+    cleaned, errors = validate_print_request({'barcode': barcode, 'text': 'x'})
+    assert errors
+    assert 'barcode' not in cleaned
+
+
+def test_dither_modes_match_the_driver():
+    assert ALLOWED_DITHER_MODES == set(DITHER_MODES)
+    _, errors = validate_print_request({'text': 'x', 'dither': 'diffusion'})
+    assert errors
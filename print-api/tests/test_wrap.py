@@ -0,0 +1,67 @@
+"""WrapEngine line-breaking rules."""
+import pytest
+
+from driver import renderer
+from driver.wrap import WrapEngine, _break_points
+
+FONT_KEY = renderer._font_key('montserrat', False, 24)
+
+
+@pytest.fixture
+def font():
+    return renderer._get_font('montserrat', False, 24)
+
+
+def _texts(lines):
+    return [text for text, _ in lines]
+
+
+def test_lines_fit_and_break_at_spaces(font):
+    paragraph = "the quick brown fox jumps over the lazy dog " * 4
+    lines = WrapEngine(16).wrap(FONT_KEY, font, paragraph.strip(), 200)
+    assert len(lines) > 1
+    for text, width in lines:
+        assert width <= 200
+        assert text == text.strip()
+        assert width == pytest.approx(font.getlength(text), abs=1)
+    assert " ".join(_texts(lines)) == paragraph.strip()
+
+
+def test_keeps_leading_indent(font):
+    lines = WrapEngine(16).wrap(FONT_KEY, font, "    indented text", 512)
+    assert _texts(lines) == ["    indented text"]
+
+
+def test_blank_paragraph(font):
+    engine = WrapEngine(16)
+    assert engine.wrap(FONT_KEY, font, "", 512) == [('', 0.0)]
+    assert engine.wrap(FONT_KEY, font, "   ", 512) == [('', 0.0)]
+
+
+def test_hyphen_breaks():
+    assert list(_break_points("well-known")) == [5]
+    assert list(_break_points("x-ray")) == []
+    assert list(_break_points("a  b")) == [1]
+
+
+def test_overlong_word_starts_a_fresh_line(font):
+    word = "W" * 40
+    lines = WrapEngine(16).wrap(FONT_KEY, font, "ab " + word, 200)
+    assert lines[0][0] == "ab"
+    assert "".join(_texts(lines[1:])) == word
+    assert all(width <= 200 for _, width in lines)
+
+
+def test_narrower_than_one_character(font):
+    lines = WrapEngine(16).wrap(FONT_KEY, font, "WW", 5)
+    assert _texts(lines) == ["W", "W"]
+
+
+def test_cache_is_bounded(font):
+    engine = WrapEngine(2)
+    first = engine.wrap(FONT_KEY, font, "one", 512)
+    assert engine.wrap(FONT_KEY, font, "one", 512) is first
+    engine.wrap(FONT_KEY, font, "two", 512)
+    engine.wrap(FONT_KEY, font, "three", 512)
+    assert len(engine) == 2
+    assert engine.wrap(FONT_KEY, font, "one", 512) is not first